@@ -0,0 +1,195 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from tracing import tracer
+
+# LogRecord attributes that are not fields passed via extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+# Arguments of these types are immutable, so the message can safely be
+# formatted later on the logging thread
+_DEFERRABLE_ARGS = (str, int, float, bool, type(None))
+
+
+def parse_rates(value: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Parses "<logger>=<messages per second>:<burst>,...",
+    e.g. "main=20:100,uvicorn.access=50:200".
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        rate, _, burst = limit.partition(":")
+        rates[name.strip()] = (float(rate), int(burst or rate))
+    return rates
+
+
+def parse_ratios(value: str) -> Dict[str, float]:
+    """
+    Parses "<logger>=<ratio>,...", e.g. "uvicorn.access=0.1".
+    """
+    ratios = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, ratio = item.partition("=")
+        ratios[name.strip()] = float(ratio)
+    return ratios
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One record per JSON line, including the current trace ids and any fields
+    passed via extra=.
+    """
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "service": self.service,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.span_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry and key not in ("trace_id", "span_id"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class HotPathFilter(logging.Filter):
+    """
+    Sampling and rate limiting for records below WARNING. Settings are keyed by
+    logger name and apply to child loggers too ("sqlalchemy" also covers
+    "sqlalchemy.engine.Engine"). Warnings and errors always pass. The number of
+    dropped records is reported in the suppressed field of the next one that passes.
+    """
+
+    def __init__(self, rates: Dict[str, Tuple[float, int]], ratios: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.ratios = ratios
+        self.suppressed: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._rules: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, name: str) -> Tuple[Optional[str], Optional[str]]:
+        rules = self._rules.get(name)
+        if rules is None:
+            rate_key = ratio_key = None
+            candidate = name
+            while candidate:
+                if rate_key is None and candidate in self.rates:
+                    rate_key = candidate
+                if ratio_key is None and candidate in self.ratios:
+                    ratio_key = candidate
+                candidate = candidate.rpartition(".")[0]
+            rules = self._rules[name] = (rate_key, ratio_key)
+        return rules
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate_key, ratio_key = self._lookup(record.name)
+        if ratio_key is not None and random.random() >= self.ratios[ratio_key]:
+            return False
+        if rate_key is None:
+            return True
+
+        rate, burst = self.rates[rate_key]
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(rate_key, (float(burst), now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens < 1:
+                self._buckets[rate_key] = (tokens, now)
+                self.suppressed[rate_key] = self.suppressed.get(rate_key, 0) + 1
+                return False
+            self._buckets[rate_key] = (tokens - 1, now)
+            suppressed = self.suppressed.pop(rate_key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them, so messages are rendered and written
+    on the QueueListener thread instead of the event loop. Messages with mutable
+    arguments are rendered immediately to capture their state at call time.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = tracer.current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        if record.args and not all(isinstance(arg, _DEFERRABLE_ARGS) for arg in (
+            record.args.values() if isinstance(record.args, dict) else record.args
+        )):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Logging must never stall request handling: drop the record when the queue is full
+            pass
+
+
+def setup_logging(service: str, default_rates: str = "", default_sampling: str = "") -> QueueListener:
+    """
+    Configures the root logger with the hot-path filter, a non-blocking queue and
+    a listener thread that writes to stdout. Environment variables:
+      LOG_LEVEL        - level (INFO by default);
+      LOG_FORMAT       - json or text;
+      LOG_RATE_LIMITS  - per-logger rate limits, see parse_rates;
+      LOG_SAMPLING     - per-logger share of records that are kept, see parse_ratios;
+      LOG_QUEUE_SIZE   - size of the record queue.
+    """
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    else:
+        formatter = JsonFormatter(service)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(HotPathFilter(
+        parse_rates(os.getenv("LOG_RATE_LIMITS", default_rates)),
+        parse_ratios(os.getenv("LOG_SAMPLING", default_sampling)),
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # uvicorn configures its loggers before importing the app; route them through the queue
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
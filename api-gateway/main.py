@@ -1,31 +1,97 @@
 import os
 import httpx
 from itertools import cycle
-from fastapi import FastAPI, HTTPException, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Query, Response, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from aiobreaker import CircuitBreaker, CircuitBreakerError
+from contextlib import asynccontextmanager
 from datetime import timedelta
 import asyncio
 import json
 import logging
+import redis.asyncio as redis
+import time
 import websockets
+from typing import Optional
+from urllib.parse import urlencode
+from prometheus_client import REGISTRY
 
-app = FastAPI()
-
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,  # Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+from metrics import (
+    UPSTREAM_LATENCY, CircuitBreakerCollector, CounterCollector, MetricsMiddleware, metrics_response,
 )
+from rate_limiter import RateLimit, RateLimiter, RateLimitMiddleware, RouteRule, parse_limit
+from logging_config import setup_logging
+from profiling import LoopLagMonitor, SamplingProfiler, require_admin
+from tracing import TracingMiddleware, tracer
+
+# Redis shared by all gateway replicas for rate limiting
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=0, decode_responses=True, socket_timeout=0.5)
+
+# Sampling profiler and event loop lag monitor behind the /admin endpoints
+profiler = SamplingProfiler()
+loop_monitor = LoopLagMonitor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag_task = loop_monitor.start()
+    readiness_task = asyncio.create_task(poll_readiness())
+    yield
+    readiness_task.cancel()
+    loop_lag_task.cancel()
+    loop_monitor.stop()
+    profiler.stop()
+    await redis_client.close()
+    if tracer.exporter is not None:
+        tracer.exporter.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+# Logging setup: JSON lines written from a background thread, with rate limits
+# for the per-request circuit breaker and access logs (see logging_config.py)
+setup_logging("api-gateway", default_rates="main=100:500,uvicorn.access=100:500")
 logger = logging.getLogger(__name__)
 
+# Token-bucket limits as "<requests per second>:<burst>", per client (JWT subject or IP).
+# Each rule can be overridden with RATE_LIMIT_<NAME>, e.g. RATE_LIMIT_LOBBY_LIST=5:20
+def rate_limit(name: str, default: str) -> RateLimit:
+    return parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+
+RATE_LIMIT_RULES = [
+    RouteRule("login", "POST", "/game_service/login", rate_limit("login", "0.5:5")),
+    RouteRule("register", "POST", "/game_service/register", rate_limit("register", "0.2:3")),
+    RouteRule("game_service", None, "/game_service/", rate_limit("game_service", "5:20")),
+    RouteRule("create_lobby", "POST", "/lobbies", rate_limit("create_lobby", "0.5:5")),
+    RouteRule("lobby_list", "GET", "/lobbies", rate_limit("lobby_list", "2:10")),
+    RouteRule("matchmaking", None, "/matchmaking/", rate_limit("matchmaking", "1:5")),
+    RouteRule("websocket", None, "/ws/", rate_limit("websocket", "1:10")),
+]
+
+rate_limiter = RateLimiter(
+    redis_client,
+    RATE_LIMIT_RULES,
+    default=rate_limit("default", "10:40"),
+    secret_key=os.getenv("SECRET_KEY", "banana"),  # Must match SECRET_KEY in game-service
+)
+
+# Added before CORS so that 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Limit the list if necessary
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
+# Outermost, so rejected and failed requests are measured too
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+REGISTRY.register(CounterCollector(
+    "gateway_rate_limit_decisions", "Rate limiter decisions", "decision", rate_limiter.stats
+))
 
 # List of URLs for game-service instances
 GAME_SERVICE_INSTANCES = [
@@ -57,6 +123,31 @@ global_circuit_breaker = CircuitBreaker(
     name='global_cb'
 )
 
+REGISTRY.register(CircuitBreakerCollector(lambda: {
+    breaker.name: breaker
+    for breaker in [*game_service_circuit_breakers.values(), global_circuit_breaker]
+}))
+
+# Readiness of each game-service instance, polled from its /ready endpoint. Instances that
+# are warming up, shutting down or unreachable are skipped by the round-robin while any
+# other instance is ready. Until the first poll completes every instance counts as ready.
+READINESS_INTERVAL = float(os.getenv("READINESS_INTERVAL", 2))
+game_service_ready = {service_url: True for service_url in GAME_SERVICE_INSTANCES}
+
+async def poll_readiness():
+    async with httpx.AsyncClient(timeout=READINESS_INTERVAL) as client:
+        while True:
+            results = await asyncio.gather(
+                *(client.get(f"{service_url}ready") for service_url in GAME_SERVICE_INSTANCES),
+                return_exceptions=True,
+            )
+            for service_url, result in zip(GAME_SERVICE_INSTANCES, results):
+                ready = isinstance(result, httpx.Response) and result.status_code == 200
+                if ready != game_service_ready[service_url]:
+                    logger.info("Game service instance %s is %s", service_url, "ready" if ready else "not ready")
+                game_service_ready[service_url] = ready
+            await asyncio.sleep(READINESS_INTERVAL)
+
 # Indices for round-robin
 current_game_index = 0
 
@@ -101,11 +192,16 @@ async def attempt_to_proxy_request(request: Request, path: str, max_instances_to
             continue
         tried_instances.add(service_url)
 
+        # Skip instances that are not ready, unless none of them is
+        if not game_service_ready[service_url] and any(game_service_ready.values()):
+            logger.debug("Game service instance %s is not ready, skipping.", service_url)
+            continue
+
         circuit_breaker = game_service_circuit_breakers[service_url]  # Circuit Breaker for the current instance
 
         # Check if the Circuit Breaker is open
         if circuit_breaker.current_state.name == "open":
-            logger.info(f"Circuit breaker is open for {service_url}, skipping.")
+            logger.info("Circuit breaker is open for %s, skipping.", service_url)
             continue
 
         try:
@@ -119,9 +215,9 @@ async def attempt_to_proxy_request(request: Request, path: str, max_instances_to
                 headers=dict(response.headers)
             )
         except CircuitBreakerError:
-            logger.info(f"Circuit breaker is now open for {service_url}, skipping.")
+            logger.info("Circuit breaker is now open for %s, skipping.", service_url)
         except Exception as exc:
-            logger.error(f"Unhandled error for {service_url}: {exc}")
+            logger.error("Unhandled error for %s: %s", service_url, exc)
 
     # If we reach here, all attempts have failed
     logger.error("All attempts to proxy the request have failed.")
@@ -137,21 +233,21 @@ async def attempt_requests_with_retries(service_url: str, path: str, request: Re
     for attempt in range(1, max_retries + 1):
         # If Circuit Breaker is already open, skip remaining attempts
         if circuit_breaker.current_state.name == "open":
-            logger.info(f"Circuit breaker is open for {service_url}, skipping retries.")
+            logger.info("Circuit breaker is open for %s, skipping retries.", service_url)
             raise CircuitBreakerError
 
         try:
-            logger.info(f"Attempt {attempt} for {service_url}")
+            logger.debug("Attempt %s for %s", attempt, service_url)
             # Attempt to make a request through the Circuit Breaker
             return await circuit_breaker.call_async(async_request_to_service, service_url, path, request)
         except CircuitBreakerError:
             # Circuit Breaker opened during this attempt
-            logger.info(f"Circuit breaker is now open for {service_url}, skipping further retries.")
+            logger.info("Circuit breaker is now open for %s, skipping further retries.", service_url)
             raise
         except httpx.RequestError as exc:
-            logger.error(f"Attempt {attempt} failed for {service_url}: {exc}")
+            logger.error("Attempt %s failed for %s: %s", attempt, service_url, exc)
         except Exception as exc:
-            logger.error(f"Unhandled exception on attempt {attempt} for {service_url}: {exc}")
+            logger.error("Unhandled exception on attempt %s for %s: %s", attempt, service_url, exc)
 
         # If the request failed, wait before retrying
         await asyncio.sleep(0.1)
@@ -168,23 +264,70 @@ async def async_request_to_service(service_url: str, path: str, request: Request
     headers = dict(request.headers)
     body = await request.body()
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.request(
-                method=method,
-                url=f"{service_url}{path}",
-                headers=headers,
-                content=body,
-                timeout=10.0
-            )
-            response.raise_for_status()  # Raises exception for 4xx/5xx responses
-            return response
-        except httpx.HTTPStatusError as exc:
-            logger.error(f"HTTP error from {service_url}: {exc.response.status_code} - {exc.response.text}")
-            raise
-        except httpx.RequestError as exc:
-            logger.error(f"Request error while contacting {service_url}: {exc}")
-            raise
+    outcome = "success"
+    start = time.perf_counter()
+    # One span per attempt; the traceparent lets game-service continue the trace
+    with tracer.span("proxy game_service", **{"upstream.instance": service_url, "http.method": method}) as span:
+        tracer.inject(headers)
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.request(
+                    method=method,
+                    url=f"{service_url}{path}",
+                    headers=headers,
+                    content=body,
+                    timeout=10.0
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                response.raise_for_status()  # Raises exception for 4xx/5xx responses
+                return response
+            except httpx.HTTPStatusError as exc:
+                outcome = "http_error"
+                logger.error("HTTP error from %s: %s - %s", service_url, exc.response.status_code, exc.response.text)
+                raise
+            except httpx.RequestError as exc:
+                outcome = "request_error"
+                logger.error("Request error while contacting %s: %s", service_url, exc)
+                raise
+            finally:
+                UPSTREAM_LATENCY.labels("game_service", service_url, outcome).observe(time.perf_counter() - start)
+
+# Prometheus metrics; must be registered before the catch-all lobby_service route
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
+
+# Runtime profiling of the gateway itself; requires the X-Admin-Token header.
+# Registered before the catch-all route so these paths are not proxied.
+@app.post("/admin/profiler/start")
+async def start_profiler(
+    interval: Optional[float] = Query(None, gt=0, le=1),
+    all_threads: bool = False,
+    admin: None = Depends(require_admin),
+):
+    """
+    Starts the sampling profiler. Only the event loop thread is sampled unless all_threads is set.
+    """
+    if not profiler.start(interval, all_threads):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return {"status": "started", "interval": profiler.interval, "maxSeconds": profiler.max_seconds}
+
+@app.post("/admin/profiler/stop", response_class=PlainTextResponse)
+async def stop_profiler(admin: None = Depends(require_admin)):
+    """
+    Stops the profiler and returns the samples as folded stacks (flamegraph.pl, speedscope).
+    """
+    if profiler.started_at is None:
+        raise HTTPException(status_code=409, detail="Profiler was not started")
+    folded = profiler.stop()
+    return PlainTextResponse(folded, headers={"X-Profile-Samples": str(profiler.sample_count)})
+
+@app.get("/admin/loop-lag")
+async def get_loop_lag(admin: None = Depends(require_admin)):
+    """
+    Returns event loop lag and recent blocking events with the stack that caused them.
+    """
+    return loop_monitor.snapshot()
 
 # New route to proxy lobby_service (HTTP)
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"])
@@ -195,68 +338,134 @@ async def proxy_to_lobby_service(request: Request, path: str):
     """
     lobby_service_url = LOBBY_SERVICE_URL
     url = f"{lobby_service_url}{path}"
+    if request.url.query:
+        url = f"{url}?{request.url.query}"
 
     method = request.method
     headers = dict(request.headers)
     body = await request.body()
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=headers,
-                content=body,
-                timeout=10.0  # Set appropriate timeout
-            )
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-        except httpx.RequestError as exc:
-            logger.error(f"Request error while contacting lobby_service: {exc}")
-            raise HTTPException(status_code=503, detail="Lobby Service is unavailable.")
-        except httpx.HTTPStatusError as exc:
-            logger.error(f"HTTP error from lobby_service: {exc.response.status_code} - {exc.response.text}")
-            raise HTTPException(status_code=exc.response.status_code, detail=exc.response.text)
+    outcome = "success"
+    start = time.perf_counter()
+    with tracer.span("proxy lobby_service", **{"upstream.instance": lobby_service_url, "http.method": method}) as span:
+        tracer.inject(headers)
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    content=body,
+                    timeout=10.0  # Set appropriate timeout
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                if response.status_code >= 500:
+                    outcome = "http_error"
+                return Response(
+                    content=response.content,
+                    status_code=response.status_code,
+                    headers=dict(response.headers)
+                )
+            except httpx.RequestError as exc:
+                outcome = "request_error"
+                logger.error("Request error while contacting lobby_service: %s", exc)
+                raise HTTPException(status_code=503, detail="Lobby Service is unavailable.")
+            except httpx.HTTPStatusError as exc:
+                logger.error("HTTP error from lobby_service: %s - %s", exc.response.status_code, exc.response.text)
+                raise HTTPException(status_code=exc.response.status_code, detail=exc.response.text)
+            finally:
+                UPSTREAM_LATENCY.labels("lobby_service", lobby_service_url, outcome).observe(time.perf_counter() - start)
 
 # New route to proxy WebSocket connections with lobby_service
 @app.websocket("/ws/lobby/{lobbyId}")
-async def websocket_proxy_lobby_service(websocket: WebSocket, lobbyId: str, token: str):
+async def websocket_proxy_lobby_service(websocket: WebSocket, lobbyId: str, token: str, resume: Optional[str] = None):
     """
     Proxies WebSocket connections to lobby_service.
-    JWT token is passed as a query parameter.
+    JWT token is passed as a query parameter, as is the resume token of a client
+    reconnecting after a drain (see the `reconnect` message).
+    """
+    query = {"token": token}
+    if resume is not None:
+        query["resume"] = resume
+    await relay_websocket(websocket, f"ws/lobby/{lobbyId}?{urlencode(query)}")
+
+# Route to proxy read-only spectator connections to lobby_service
+@app.websocket("/ws/lobby/{lobbyId}/spectate")
+async def websocket_proxy_spectator(websocket: WebSocket, lobbyId: str, token: str):
     """
-    await websocket.accept()
+    Proxies a spectator WebSocket (board snapshot followed by the lobby's events).
+    """
+    await relay_websocket(websocket, f"ws/lobby/{lobbyId}/spectate?token={token}")
 
+# Route to proxy the lobby list stream of lobby_service
+@app.websocket("/ws/lobbies")
+async def websocket_proxy_lobby_directory(websocket: WebSocket, token: str):
+    """
+    Proxies the lobby directory WebSocket (initial lobby list and incremental updates).
+    """
+    await relay_websocket(websocket, f"ws/lobbies?token={token}")
+
+async def relay_websocket(websocket: WebSocket, path: str):
+    """
+    Relays a client WebSocket to lobby_service.
+    Subprotocols requested by the client (e.g. binary MessagePack) are negotiated with lobby_service,
+    and text and binary frames are relayed as is.
+    """
     # Construct URL for WebSocket connection with lobby_service
-    lobby_service_ws_url = f"ws://{LOBBY_SERVICE_URL.replace('http://', '').replace('https://', '')}ws/lobby/{lobbyId}?token={token}"
+    lobby_service_ws_url = f"ws://{LOBBY_SERVICE_URL.replace('http://', '').replace('https://', '')}{path}"
+    subprotocols = websocket.scope.get("subprotocols") or None
 
     try:
-        # Establish connection with lobby_service WebSocket
-        async with websockets.connect(lobby_service_ws_url) as service_ws:
-            logger.info(f"Connected to lobby_service WebSocket at {lobby_service_ws_url}")
+        # Establish connection with lobby_service WebSocket before accepting,
+        # so the client gets the subprotocol chosen by lobby_service
+        service_ws = await websockets.connect(lobby_service_ws_url, subprotocols=subprotocols)
+    except Exception as e:
+        logger.error("Failed to connect to lobby_service WebSocket: %s", e)
+        await websocket.close()
+        return
+
+    await websocket.accept(subprotocol=service_ws.subprotocol)
+
+    try:
+        async with service_ws:
+            logger.info("Connected to lobby_service WebSocket at %s", lobby_service_ws_url)
 
             async def forward_client_to_service():
                 try:
                     while True:
-                        message = await websocket.receive_text()
-                        await service_ws.send(message)
+                        message = await websocket.receive()
+                        if message["type"] == "websocket.disconnect":
+                            raise WebSocketDisconnect(message.get("code", 1000))
+                        if message.get("bytes") is not None:
+                            await service_ws.send(message["bytes"])
+                        else:
+                            await service_ws.send(message["text"])
                 except WebSocketDisconnect:
                     await service_ws.close()
                 except Exception as e:
-                    logger.error(f"Error forwarding client to service: {e}")
+                    logger.error("Error forwarding client to service: %s", e)
                     await service_ws.close()
 
             async def forward_service_to_client():
                 try:
-                    async for message in service_ws:
-                        await websocket.send_text(message)
-                except websockets.exceptions.ConnectionClosed:
-                    await websocket.close()
+                    while True:
+                        message = await service_ws.recv()
+                        if isinstance(message, bytes):
+                            await websocket.send_bytes(message)
+                        else:
+                            await websocket.send_text(message)
+                except websockets.exceptions.ConnectionClosed as e:
+                    # Pass the service's close code on, e.g. 1012 when lobby_service drains,
+                    # so the client knows to reconnect. Without a close frame it is an error;
+                    # an empty close frame (1005 is reserved and cannot be sent) is a normal close.
+                    if e.rcvd is None:
+                        await websocket.close(code=1011)
+                    elif e.rcvd.code == 1005:
+                        await websocket.close()
+                    else:
+                        await websocket.close(code=e.rcvd.code, reason=e.rcvd.reason)
                 except Exception as e:
-                    logger.error(f"Error forwarding service to client: {e}")
+                    logger.error("Error forwarding service to client: %s", e)
                     await websocket.close()
 
             # Run tasks for bidirectional message forwarding
@@ -272,6 +481,5 @@ async def websocket_proxy_lobby_service(websocket: WebSocket, lobbyId: str, toke
                 task.cancel()
 
     except Exception as e:
-        logger.error(f"Failed to connect to lobby_service WebSocket: {e}")
+        logger.error("Error in lobby_service WebSocket relay: %s", e)
         await websocket.close()
-
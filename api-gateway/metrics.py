@@ -0,0 +1,102 @@
+import time
+from typing import Callable, Dict
+
+from aiobreaker import CircuitBreaker
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request handling time in the gateway, including the upstream call",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "gateway_upstream_request_duration_seconds",
+    "Latency of a single proxied request to an upstream service instance",
+    ["service", "instance", "outcome"],
+)
+
+# Numeric encoding of breaker states for the gateway_circuit_breaker_state gauge
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records request latency labelled by the route template,
+    so proxied paths do not create a time series per URL.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - start)
+
+
+class CircuitBreakerCollector:
+    """
+    Exposes the current state and failure counter of each circuit breaker at scrape time.
+    """
+
+    def __init__(self, breakers: Callable[[], Dict[str, CircuitBreaker]]):
+        self.breakers = breakers
+
+    def collect(self):
+        state = GaugeMetricFamily(
+            "gateway_circuit_breaker_state",
+            "Circuit breaker state: 0 - closed, 1 - half open, 2 - open",
+            labels=["breaker"],
+        )
+        failures = GaugeMetricFamily(
+            "gateway_circuit_breaker_failures",
+            "Consecutive failures counted by the circuit breaker",
+            labels=["breaker"],
+        )
+        for name, breaker in self.breakers().items():
+            state.add_metric([name], BREAKER_STATES.get(breaker.current_state.name.lower(), -1))
+            failures.add_metric([name], breaker.fail_counter)
+        yield state
+        yield failures
+
+
+class CounterCollector:
+    """
+    Exposes a dict of counters kept by another component (e.g. RateLimiter.stats).
+    """
+
+    def __init__(self, name: str, documentation: str, label: str, counters: Dict[str, int]):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.counters = counters
+
+    def collect(self):
+        family = CounterMetricFamily(self.name, self.documentation, labels=[self.label])
+        for key, value in list(self.counters.items()):
+            family.add_metric([key], value)
+        yield family
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
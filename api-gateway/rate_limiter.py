@@ -0,0 +1,212 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import redis.asyncio as redis
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Token bucket evaluated atomically inside Redis. The clock is Redis TIME,
+# so every gateway replica refills the shared bucket at the same rate
+# regardless of local clock skew.
+# KEYS[1] - bucket key; ARGV: rate (tokens/s), burst (capacity), cost
+# Returns {allowed, remaining tokens, seconds until enough tokens}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = burst
+    ts = now
+end
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    allowed = 1
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RateLimit(NamedTuple):
+    rate: float  # Tokens added per second
+    burst: int  # Bucket capacity
+
+
+class RouteRule(NamedTuple):
+    name: str
+    method: Optional[str]  # None matches any method
+    path: str  # Path prefix
+    limit: RateLimit
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+def parse_limit(value: str) -> RateLimit:
+    """
+    Parses "<rate>:<burst>", e.g. "2:10" - 2 requests per second with bursts of up to 10.
+    """
+    rate, burst = value.split(":")
+    return RateLimit(float(rate), int(burst))
+
+
+class LocalTokenBucket:
+    """
+    In-process token buckets used while Redis is unavailable.
+    Limits are then enforced per replica instead of globally.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def consume(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        now = time.monotonic()
+        tokens, ts = self._buckets.pop(key, (float(limit.burst), now))
+        tokens = min(limit.burst, tokens + (now - ts) * limit.rate)
+        if tokens >= cost:
+            decision = Decision(True, tokens - cost, 0.0)
+            tokens -= cost
+        else:
+            decision = Decision(False, tokens, (cost - tokens) / limit.rate)
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return decision
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter with per-route rules. Buckets live in Redis so they
+    are shared by all gateway replicas; if Redis fails, the limiter switches to
+    local buckets and retries Redis after redis_retry_interval seconds.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        rules: List[RouteRule],
+        default: RateLimit,
+        secret_key: str,
+        algorithm: str = "HS256",
+        key_prefix: str = "ratelimit",
+        redis_retry_interval: float = 5.0,
+    ):
+        self.redis = redis_client
+        self.rules = rules
+        self.default = RouteRule("default", None, "/", default)
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.key_prefix = key_prefix
+        self.redis_retry_interval = redis_retry_interval
+        self.local = LocalTokenBucket()
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._redis_down_until = 0.0
+        self.stats: Dict[str, int] = {"allowed": 0, "limited": 0, "fallback": 0}
+
+    def match(self, method: str, path: str) -> RouteRule:
+        for rule in self.rules:
+            if (rule.method is None or rule.method == method) and path.startswith(rule.path):
+                return rule
+        return self.default
+
+    def identity(self, scope: Scope) -> str:
+        """
+        Verified JWT subject if the request carries a valid token, otherwise the client IP.
+        """
+        token = None
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, credentials = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer":
+                    token = credentials
+                break
+        if token is None and scope["type"] == "websocket":
+            # Browsers cannot set headers on WebSocket handshakes, the token comes in the query string
+            for part in scope.get("query_string", b"").decode("latin-1").split("&"):
+                if part.startswith("token="):
+                    token = part[len("token="):]
+                    break
+        if token:
+            try:
+                subject = jwt.decode(token, self.secret_key, algorithms=[self.algorithm]).get("sub")
+                if subject:
+                    return f"user:{subject}"
+            except JWTError:
+                pass
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                allowed, remaining, retry_after = await self._script(
+                    keys=[f"{self.key_prefix}:{key}"], args=[limit.rate, limit.burst, cost]
+                )
+                return Decision(bool(int(allowed)), float(remaining), float(retry_after))
+            except redis.RedisError as e:
+                logger.warning("Redis unavailable for rate limiting, using local buckets: %s", e)
+                self._redis_down_until = time.monotonic() + self.redis_retry_interval
+        self.stats["fallback"] += 1
+        return self.local.consume(key, limit, cost)
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware that rejects requests over the limit before they are proxied.
+    HTTP requests get 429 with Retry-After; WebSocket handshakes are refused.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket") or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.limiter.match(scope.get("method", "GET"), scope["path"])
+        identity = self.limiter.identity(scope)
+        decision = await self.limiter.check(f"{rule.name}:{identity}", rule.limit)
+        if decision.allowed:
+            self.limiter.stats["allowed"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        self.limiter.stats["limited"] += 1
+        retry_after = max(1, math.ceil(decision.retry_after))
+        logger.info("Rate limit '%s' exceeded by %s, retry after %ss", rule.name, identity, retry_after)
+        if scope["type"] == "websocket":
+            # Closing before accept makes the server reject the handshake
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,231 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Trace context travels between services in the W3C traceparent header:
+#   00-<trace-id, 32 hex>-<span-id, 16 hex>-<flags, 01 = sampled>
+TRACEPARENT_HEADER = "traceparent"
+
+# Fraction of root traces that are recorded. A trace continued from another
+# service keeps the parent's sampled flag (parent-based sampling)
+TRACE_SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", 0.01))
+# JSONL file spans are exported to; when unset nothing is recorded
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "start_ns", "attributes", "status")
+
+    def __init__(self, trace_id: str, span_id: str, parent_id: Optional[str], name: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """
+    Parses a traceparent header into (trace_id, parent_span_id, sampled), or None if invalid.
+    """
+    parts = value.strip().lower().split("-")
+    if len(parts) != 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, span_id, flags = parts
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id, span_id, sampled
+
+
+class JsonlExporter:
+    """
+    Writes finished spans to a JSONL file from a background thread so that disk I/O
+    never blocks the event loop. Spans are dropped when the queue is full.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, record: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def shutdown(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch: List[Optional[Dict[str, Any]]] = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            if records:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(record, default=str) + "\n" for record in records)
+                except OSError as e:
+                    logger.warning("Failed to write spans to %s: %s", self.path, e)
+            if len(records) != len(batch):
+                return
+
+
+class Tracer:
+    def __init__(self, service: str, sample_ratio: float = TRACE_SAMPLE_RATIO, exporter: Optional[JsonlExporter] = None):
+        self.service = service
+        self.sample_ratio = sample_ratio
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, remote: Optional[Tuple[str, str, bool]] = None) -> Span:
+        """
+        Creates a child of the current span, of the remote parent (from traceparent),
+        or a new root span. The span does not become current.
+        """
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        else:
+            parent = _current_span.get()
+            if parent is not None:
+                trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+            else:
+                trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+                sampled = self.exporter is not None and random.random() < self.sample_ratio
+        return Span(trace_id, f"{random.getrandbits(64):016x}", parent_id, name, sampled)
+
+    def end_span(self, span: Span):
+        if not span.sampled or self.exporter is None:
+            return
+        end_ns = time.time_ns()
+        self.exporter.export({
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id,
+            "name": span.name,
+            "service": self.service,
+            "startTimeUnixNano": span.start_ns,
+            "endTimeUnixNano": end_ns,
+            "durationMs": round((end_ns - span.start_ns) / 1e6, 3),
+            "attributes": span.attributes,
+            "status": span.status,
+        })
+
+    @contextmanager
+    def span(self, name: str, remote: Optional[Tuple[str, str, bool]] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Span that is current for the duration of the block. Safe in coroutines:
+        the current span lives in a contextvar, so tasks do not see each other's spans.
+        """
+        span = self.start_span(name, remote)
+        if span.sampled:
+            span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def inject(self, headers: Dict[str, str]) -> Dict[str, str]:
+        """
+        Adds the current span's traceparent to outgoing request headers.
+        """
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent()
+        return headers
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that continues the trace from an incoming traceparent (or starts
+    a new one) and records a server span for every HTTP request.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        remote = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                remote = parse_traceparent(value.decode("latin-1"))
+                break
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with self.tracer.span(f"HTTP {scope['method']}", remote, **{"http.path": scope["path"]}) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"HTTP {scope['method']} {route.path}"
+
+
+tracer = Tracer(
+    "api-gateway",
+    exporter=JsonlExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None,
+)
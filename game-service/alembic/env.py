@@ -1,5 +1,6 @@
 # alembic/env.py
 import asyncio
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import pool
@@ -12,6 +13,10 @@ from models import Base  # Import your models
 config = context.config
 fileConfig(config.config_file_name)
 
+# The service's DATABASE_URL takes precedence over sqlalchemy.url in alembic.ini
+if os.environ.get("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
+
 target_metadata = Base.metadata
 
 def run_migrations_online():
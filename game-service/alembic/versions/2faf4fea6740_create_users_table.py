@@ -32,7 +32,8 @@ def upgrade() -> None:
     op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
     op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
     op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
-    op.drop_table('test_table')
+    # test_table only exists in databases from before this migration
+    op.execute('DROP TABLE IF EXISTS test_table')
     # ### end Alembic commands ###
 
 
@@ -0,0 +1,273 @@
+# bulk_import.py
+import argparse
+import asyncio
+import codecs
+import csv
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import USERS_IMPORTED
+from models import UserDB
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 2000))  # Records checked, hashed and inserted together
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 0)) or os.cpu_count() or 1  # bcrypt worker processes
+MAX_REPORTED_ERRORS = 100
+
+# Same scheme as main.pwd_context; each worker process has its own copy
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+users = UserDB.__table__
+DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+TRUE_VALUES = {"1", "true", "yes"}
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    # Runs in a worker process
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def import_executor(workers: int = IMPORT_WORKERS) -> ProcessPoolExecutor:
+    """
+    Process pool for bcrypt. Workers are spawned rather than forked, since the service
+    process runs logging and profiler threads, and only once the first batch is submitted.
+    """
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def detect_format(filename: Optional[str]) -> str:
+    return "csv" if filename and filename.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yields (line number, record) from CSV with a header row or from JSON Lines.
+    A JSON line that does not parse is yielded as None and reported as invalid.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record
+
+
+def upload_lines(file) -> Iterator[str]:
+    # An UploadFile is a SpooledTemporaryFile of bytes; on Python 3.9 it cannot be wrapped in TextIOWrapper
+    return codecs.iterdecode(file, "utf-8-sig")
+
+
+def _text(record: Dict[str, Any], name: str) -> Optional[str]:
+    value = record.get(name)
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string")
+    value = value.strip()
+    limit = users.c[name].type.length
+    if limit is not None and len(value) > limit:
+        raise ValueError(f"{name} is longer than {limit} characters")
+    return value or None
+
+
+def validate(record: Any) -> Dict[str, Any]:
+    """
+    Row for the users table. A plain-text password is kept under "password" until it is hashed.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    username = _text(record, "username")
+    if username is None:
+        raise ValueError("username is required")
+    disabled = record.get("disabled")
+    row = {
+        "username": username,
+        "email": _text(record, "email"),
+        "full_name": _text(record, "full_name"),
+        "disabled": disabled if isinstance(disabled, bool) else str(disabled).lower() in TRUE_VALUES,
+    }
+    hashed_password = _text(record, "hashed_password")
+    if hashed_password is not None:
+        if pwd_context.identify(hashed_password, required=False) is None:
+            raise ValueError("hashed_password is not a bcrypt hash")
+        row["hashed_password"] = hashed_password
+    elif record.get("password"):
+        if not isinstance(record["password"], str):
+            raise ValueError("password must be a string")
+        row["password"] = record["password"]
+    else:
+        raise ValueError("password or hashed_password is required")
+    return row
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0  # Username or email already taken, in the database or earlier in the file
+        self.invalid = 0
+        self.errors: List[str] = []
+        self.started = time.perf_counter()
+
+    def error(self, line_number: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line_number}: {message}")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+class BulkImporter:
+    """
+    Imports users in chunks of chunk_size records instead of one /register call each.
+
+    For every chunk, taken usernames and emails are found with one query and dropped
+    before hashing, plain-text passwords are hashed in parallel across the worker
+    processes (pre-hashed bcrypt values are stored as they are), and the rows are
+    written by a multi-row INSERT ... ON CONFLICT DO NOTHING in one transaction.
+    The conflict clause covers users registered while the import runs, so an import
+    can be interrupted and run again: rows already imported are skipped.
+    """
+
+    def __init__(self, engine: AsyncEngine, executor: Executor, workers: int = IMPORT_WORKERS, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.engine = engine
+        self.executor = executor
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.insert = DIALECT_INSERTS[engine.dialect.name]
+
+    async def run(self, records: Iterator[Tuple[int, Any]]) -> ImportResult:
+        loop = asyncio.get_running_loop()
+        result = ImportResult()
+        while True:
+            # The source is a file on disk, so it is read in a thread
+            chunk = await loop.run_in_executor(None, list, itertools.islice(records, self.chunk_size))
+            if not chunk:
+                break
+            await self._import_chunk(chunk, result)
+            logger.info("Imported %s users, skipped %s, invalid %s", result.inserted, result.skipped, result.invalid)
+        return result
+
+    async def _import_chunk(self, chunk: List[Tuple[int, Any]], result: ImportResult):
+        rows = []
+        usernames, emails = set(), set()
+        invalid = 0
+        for line_number, record in chunk:
+            try:
+                row = validate(record)
+            except ValueError as e:
+                result.error(line_number, str(e))
+                invalid += 1
+                continue
+            if row["username"] in usernames or (row["email"] is not None and row["email"] in emails):
+                continue
+            usernames.add(row["username"])
+            if row["email"] is not None:
+                emails.add(row["email"])
+            rows.append(row)
+
+        rows = await self._drop_taken(rows, usernames, emails)
+        await self._hash(rows)
+        inserted = await self._insert(rows)
+        skipped = len(chunk) - invalid - inserted
+        result.inserted += inserted
+        result.skipped += skipped
+        USERS_IMPORTED.labels("inserted").inc(inserted)
+        USERS_IMPORTED.labels("skipped").inc(skipped)
+        USERS_IMPORTED.labels("invalid").inc(invalid)
+
+    async def _drop_taken(self, rows: List[Dict[str, Any]], usernames: set, emails: set) -> List[Dict[str, Any]]:
+        if not rows:
+            return rows
+        condition = users.c.username.in_(usernames)
+        if emails:
+            condition = or_(condition, users.c.email.in_(emails))
+        async with self.engine.connect() as conn:
+            taken = (await conn.execute(select(users.c.username, users.c.email).where(condition))).all()
+        taken_usernames = {username for username, _ in taken}
+        taken_emails = {email for _, email in taken if email is not None}
+        return [row for row in rows if row["username"] not in taken_usernames and row["email"] not in taken_emails]
+
+    async def _hash(self, rows: List[Dict[str, Any]]):
+        pending = [row for row in rows if "password" in row]
+        if not pending:
+            return
+        loop = asyncio.get_running_loop()
+        size = math.ceil(len(pending) / self.workers)
+        batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+        hashes = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, hash_passwords, [row["password"] for row in batch])
+            for batch in batches
+        ))
+        for batch, batch_hashes in zip(batches, hashes):
+            for row, hashed_password in zip(batch, batch_hashes):
+                del row["password"]
+                row["hashed_password"] = hashed_password
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        # executemany with RETURNING is sent as multi-row INSERT statements ("insertmanyvalues")
+        statement = self.insert(users).on_conflict_do_nothing().returning(users.c.id)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(statement, rows)
+            return len(result.all())
+
+
+async def main_async(args: argparse.Namespace) -> ImportResult:
+    from database import engine
+
+    fmt = args.format or detect_format(args.file)
+    try:
+        with import_executor(args.workers) as executor, open(args.file, encoding="utf-8-sig", newline="") as f:
+            return await BulkImporter(engine, executor, args.workers, args.chunk_size).run(read_records(f, fmt))
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk user import into the game-service database (DATABASE_URL). "
+        "Records have username, optional email, full_name and disabled, "
+        "and either password or a bcrypt hashed_password.",
+    )
+    parser.add_argument("file", help="CSV with a header row, or JSON Lines")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: by file extension")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="bcrypt worker processes")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    result = asyncio.run(main_async(args))
+    print(json.dumps(result.as_dict(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,44 @@
 # game_service/main.py
 import asyncio
+import logging
 import os
+import time
 from datetime import datetime, timedelta
 from typing import AsyncGenerator, Dict, Optional
 from contextlib import asynccontextmanager
 
 import httpx
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
 from sqlalchemy.future import select
 
+from bulk_import import BulkImporter, detect_format, import_executor, read_records, upload_lines
 from database import AsyncSessionLocal, engine
-from models import Base, UserDB  # Ensure you import Base
+from logging_config import setup_logging
+from metrics import PASSWORD_HASHING, MetricsMiddleware, metrics_response
+from profiling import LoopLagMonitor, SamplingProfiler, require_admin
+from tracing import TracingMiddleware, tracer
+from models import UserDB
+from serialization import FastJSONResponse
+
+# JSON logs written from a background thread; uvicorn access logs are rate limited
+setup_logging(os.getenv("INSTANCE_NAME", "game-service"), default_rates="uvicorn.access=100:500")
+logger = logging.getLogger(__name__)
+
+# Sampling profiler and event loop lag monitor behind the /admin endpoints
+profiler = SamplingProfiler()
+loop_monitor = LoopLagMonitor()
+# Pause between warm-up attempts while the database is unavailable
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", 2))
+# bcrypt worker processes for /admin/users/import; started on the first import
+bulk_import_executor = import_executor()
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
@@ -26,20 +47,49 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code executed before the application starts
-    import models  # Ensure models are imported so that Base has all the metadata
-    
-    async with engine.begin() as conn:
-        # Run the create_all in a synchronous context within the async engine
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created successfully.")
+    # The schema is managed by Alembic (alembic upgrade head), run once before the replicas start.
+    # /ready answers 503 until warm_up has finished
+    app.state.status = "starting"
+    loop_lag_task = loop_monitor.start()
+    warmup_task = asyncio.create_task(warm_up(app))
 
     yield  # Application is running
 
-    on_shutdown()  # Dispose of the database engine
-    
+    app.state.status = "stopping"
+    warmup_task.cancel()
+    loop_lag_task.cancel()
+    loop_monitor.stop()
+    profiler.stop()
+    bulk_import_executor.shutdown(wait=False, cancel_futures=True)
+
+    if tracer.exporter is not None:
+        tracer.exporter.shutdown()
+    await engine.dispose()
+
+async def warm_up(app: FastAPI):
+    """
+    Opens the database pool's connections and loads the bcrypt backend, which passlib
+    does on the first hash, so the first logins do not pay for it. Until this is done
+    /ready answers 503 and the gateway does not route requests to the instance.
+    """
+    async def open_connection():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    while True:
+        try:
+            # Concurrent checkouts open all of the pool's persistent connections
+            await asyncio.gather(*(open_connection() for _ in range(engine.pool.size())))
+            break
+        except Exception as e:
+            logger.warning("Warm-up failed, retrying in %s s: %s", WARMUP_RETRY_SECONDS, e)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    await asyncio.to_thread(pwd_context.hash, "warm-up")
+    app.state.status = "ready"
+    logger.info("Instance is ready to serve traffic.")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +98,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 # JWT Configuration
 SECRET_KEY = "banana"  # Replace with your secure secret key
@@ -83,10 +135,20 @@ class TokenData(BaseModel):
 
 # User and Password Utilities
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    start = time.perf_counter()
+    try:
+        with tracer.span("bcrypt.verify"):
+            return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        PASSWORD_HASHING.labels("verify").observe(time.perf_counter() - start)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    start = time.perf_counter()
+    try:
+        with tracer.span("bcrypt.hash"):
+            return pwd_context.hash(password)
+    finally:
+        PASSWORD_HASHING.labels("hash").observe(time.perf_counter() - start)
 
 async def get_user(db: AsyncSession, username: str) -> Optional[UserDB]:
     result = await db.execute(select(UserDB).where(UserDB.username == username))
@@ -190,7 +252,7 @@ async def read_users_me(
 SERVICE2_URL = "http://localhost:5002/lobby_service/data"
 TIMEOUT = 10  # Set your desired timeout in seconds
 
-@app.get("/hello", response_class=JSONResponse)
+@app.get("/hello", response_class=FastJSONResponse)
 async def hello_game_service():
     """
     Returns a greeting message from game_service.
@@ -202,18 +264,81 @@ async def hello_game_service():
     instance_name = os.getenv("INSTANCE_NAME", "unknown")
     return {"message": f"Hello from game_service instance {instance_name}"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
+
 @app.get("/health")
 def health_check():
+    """
+    Liveness: the process is up and serving requests.
+    """
     return {"status": "healthy"}
 
-@app.get("/combined", response_class=JSONResponse)
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """
+    Readiness: 200 once warmed up, 503 while warming up or shutting down.
+    """
+    instance_status = request.app.state.status
+    if instance_status != "ready":
+        return FastJSONResponse({"status": instance_status}, status_code=503)
+    return {"status": instance_status}
+
+# Runtime profiling; requires the X-Admin-Token header
+@app.post("/admin/profiler/start")
+async def start_profiler(
+    interval: Optional[float] = Query(None, gt=0, le=1),
+    all_threads: bool = False,
+    admin: None = Depends(require_admin),
+):
+    """
+    Starts the sampling profiler. Only the event loop thread is sampled unless all_threads is set.
+    """
+    if not profiler.start(interval, all_threads):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return {"status": "started", "interval": profiler.interval, "maxSeconds": profiler.max_seconds}
+
+@app.post("/admin/profiler/stop", response_class=PlainTextResponse)
+async def stop_profiler(admin: None = Depends(require_admin)):
+    """
+    Stops the profiler and returns the samples as folded stacks (flamegraph.pl, speedscope).
+    """
+    if profiler.started_at is None:
+        raise HTTPException(status_code=409, detail="Profiler was not started")
+    folded = profiler.stop()
+    return PlainTextResponse(folded, headers={"X-Profile-Samples": str(profiler.sample_count)})
+
+@app.get("/admin/loop-lag")
+async def get_loop_lag(admin: None = Depends(require_admin)):
+    """
+    Returns event loop lag and recent blocking events with the stack that caused them.
+    """
+    return loop_monitor.snapshot()
+
+@app.post("/admin/users/import")
+async def import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    admin: None = Depends(require_admin),
+):
+    """
+    Bulk user import from CSV (with a header row) or JSON Lines, by file extension unless format is set.
+    Records have username, optional email, full_name and disabled, and either password or a bcrypt
+    hashed_password. Taken usernames and emails are skipped; invalid records are counted and reported.
+    """
+    importer = BulkImporter(engine, bulk_import_executor)
+    result = await importer.run(read_records(upload_lines(file.file), format or detect_format(file.filename)))
+    return result.as_dict()
+
+@app.get("/combined", response_class=FastJSONResponse)
 async def get_combined_data():
     """
     Retrieves data from Service2 and returns a combined response.
     """
     async with httpx.AsyncClient() as client:
         try:
-            response = await asyncio.wait_for(client.get(SERVICE2_URL), timeout=TIMEOUT)
+            response = await asyncio.wait_for(client.get(SERVICE2_URL, headers=tracer.inject({})), timeout=TIMEOUT)
             response.raise_for_status()  # Raises an exception for HTTP errors
             service2_data = response.json()
         except asyncio.TimeoutError:
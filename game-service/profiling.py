@@ -0,0 +1,191 @@
+# profiling.py
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import Header, HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Token for /admin/*; the admin endpoints are disabled when it is not set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.005))  # Stack sampling period, seconds
+PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", 60))  # The profiler stops itself after this long
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", 0.1))
+LOOP_LAG_THRESHOLD = float(os.environ.get("LOOP_LAG_THRESHOLD", 0.1))  # Lag at which the loop is considered blocked
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    FastAPI dependency for admin endpoints: the X-Admin-Token header must match ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def frame_label(frame: FrameType, current_line: bool = False) -> str:
+    code = frame.f_code
+    line = frame.f_lineno if current_line else code.co_firstlineno
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})"
+
+
+def frame_stack(frame: Optional[FrameType], current_line: bool = False) -> List[str]:
+    """
+    Stack from the root to the given frame. A running coroutine's frames are on the
+    event loop thread's stack, so this shows which handler is holding the loop.
+    Frames are labelled with the function's first line so profile samples aggregate,
+    or with the executing line when current_line is set.
+    """
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame, current_line))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread samples stacks via sys._current_frames()
+    every interval seconds. The result is in folded-stacks format
+    ("frame;frame;frame count"), as read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = PROFILER_INTERVAL, max_seconds: float = PROFILER_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, all_threads: bool = False) -> bool:
+        """
+        Starts sampling. Without all_threads only the thread that called start (the
+        event loop thread) is sampled. Returns False if the profiler is already running.
+        """
+        if self.running:
+            return False
+        self.interval = interval or self.interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = time.monotonic()
+        self._target = None if all_threads else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> str:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = self.started_at + self.max_seconds
+        names = {}
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= deadline:
+                logger.warning("Profiler stopped after %s s", self.max_seconds)
+                return
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self._target is not None and thread_id != self._target):
+                    continue
+                stack = frame_stack(frame)
+                if self._target is None:
+                    if thread_id not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stack.insert(0, names.get(thread_id, str(thread_id)))
+                self.samples[";".join(stack)] += 1
+            self.sample_count += 1
+
+
+class LoopLagMonitor:
+    """
+    Tracks event loop lag. A task sleeps for interval seconds and measures how late it
+    wakes up. A watchdog thread notices when the loop is overdue and captures the loop
+    thread's stack while it is blocked, so the report shows the synchronous call
+    responsible (e.g. bcrypt).
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD, history: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_count = 0
+        self._heartbeat = time.perf_counter()
+        self._blocked_stack: Optional[List[str]] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> "asyncio.Task":
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        return asyncio.create_task(self._run())
+
+    def stop(self):
+        self._stop.set()
+
+    async def _run(self):
+        while True:
+            self._blocked_stack = None
+            self._heartbeat = start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.blocked_count += 1
+                stack = self._blocked_stack
+                self.events.append({
+                    "at": time.time(),
+                    "lag": round(lag, 4),
+                    "stack": stack,
+                })
+                logger.warning("Event loop blocked for %.3f s", lag, extra={"stack": stack})
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.perf_counter() - heartbeat - self.interval
+            if overdue >= self.threshold and self._blocked_stack is None:
+                frame = sys._current_frames().get(self._loop_thread)
+                # The loop may have recovered while the stack was taken; then the snapshot is unrelated
+                if frame is not None and heartbeat == self._heartbeat:
+                    self._blocked_stack = frame_stack(frame, current_line=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "last_lag": round(self.last_lag, 4),
+            "max_lag": round(self.max_lag, 4),
+            "blocked_count": self.blocked_count,
+            "events": list(self.events),
+        }
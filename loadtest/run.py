@@ -0,0 +1,176 @@
+"""
+Load test for the whole stack: registration/login storm, lobby creation, two-player
+WebSocket games (chat burst and a full board), then history and lobby list reads.
+
+Starts game-service, lobby-service and the gateway locally on SQLite and fakeredis
+unless --base-url points at a running gateway. Writes a JSON report with throughput
+and p50/p95/p99 latency per scenario. Exits with code 1 if any scenario had errors or
+no operations at all, and, with --baseline, on regressions against an earlier report.
+
+    python loadtest/run.py --users 40 --output reports/$(git rev-parse --short HEAD).json
+    python loadtest/run.py --baseline reports/main.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from scenarios import LoadTest
+from stack import ROOT, Stack
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def run_scenarios(base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    run_id = f"lt{int(time.time())}"
+    usernames = [f"{run_id}u{i}" for i in range(args.users)]
+    pairs = list(zip(usernames[0::2], usernames[1::2]))
+
+    load_test = LoadTest(base_url, args.concurrency, run_id)
+    try:
+        await load_test.register_and_login(usernames)
+        lobbies = await load_test.create_lobbies(pairs)
+        await load_test.play_games(lobbies, args.chat_messages)
+        await load_test.read_history(usernames, args.history_reads)
+    finally:
+        await load_test.close()
+    return {name: recorder.summary() for name, recorder in load_test.recorders.items()}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Scenarios whose p95 latency grew or throughput dropped by more than max_regression
+    (a fraction) relative to the baseline.
+    """
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None or not previous["operations"]:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 {old_p95:.1f} ms -> {new_p95:.1f} ms")
+        old_ops, new_ops = previous["throughput_ops"], current["throughput_ops"]
+        if old_ops and new_ops < old_ops * (1 - max_regression):
+            regressions.append(f"{name}: throughput {old_ops:.1f}/s -> {new_ops:.1f}/s")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def failures(scenarios: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """
+    Scenarios that had errors or did not complete a single operation.
+    """
+    allowed_empty = set()
+    if not args.chat_messages:
+        allowed_empty.add("ws_chat")
+    if not args.history_reads:
+        allowed_empty.update(("user_games", "chat_history", "lobby_list"))
+    problems = []
+    for name, result in scenarios.items():
+        if result["errors"]:
+            problems.append(f"{name}: {result['errors']} errors {result['error_kinds']}")
+        elif not result["operations"] and name not in allowed_empty:
+            problems.append(f"{name}: no operations")
+    return problems
+
+
+def print_table(scenarios: Dict[str, Any]):
+    print(f"{'scenario':<14}{'ops':>7}{'err':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=sys.stderr)
+    for name, result in scenarios.items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<14}{result['operations']:>7}{result['errors']:>6}{result['throughput_ops']:>10.1f}"
+            f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=40, help="registered users; every two play one game")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent HTTP clients")
+    parser.add_argument("--chat-messages", type=int, default=20, help="chat messages per player per game")
+    parser.add_argument("--history-reads", type=int, default=200)
+    parser.add_argument("--base-url", help="gateway of an already running stack, e.g. http://localhost:5029")
+    parser.add_argument("--workdir", help="databases and service logs of the local stack")
+    parser.add_argument("--game-db-url", help="game-service DATABASE_URL instead of SQLite")
+    parser.add_argument("--lobby-db-url", help="lobby-service DATABASE_URL instead of SQLite")
+    parser.add_argument("--redis-host", help="real Redis instead of fakeredis")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="do not lift the gateway rate limits")
+    parser.add_argument("--output", help="report file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stack: Optional[Stack] = None
+    base_url = args.base_url
+    if base_url is None:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+        stack = Stack(workdir, args.game_db_url, args.lobby_db_url, args.redis_host, args.keep_rate_limits)
+        stack.start()
+        base_url = stack.gateway_url
+        print(f"stack started, logs in {workdir}", file=sys.stderr)
+    try:
+        scenarios = asyncio.run(run_scenarios(base_url, args))
+    finally:
+        if stack is not None:
+            stack.stop()
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": "external" if args.base_url else (
+                f"{'postgres' if args.game_db_url else 'sqlite'}+{'redis' if args.redis_host else 'fakeredis'}"
+            ),
+            "params": {
+                "users": args.users,
+                "concurrency": args.concurrency,
+                "chat_messages": args.chat_messages,
+                "history_reads": args.history_reads,
+            },
+        },
+        "scenarios": scenarios,
+    }
+    print_table(scenarios)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    problems = failures(scenarios, args)
+    for problem in problems:
+        print(f"FAILED {problem}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        problems += regressions
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
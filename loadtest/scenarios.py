@@ -0,0 +1,285 @@
+"""
+Load-test scenarios driven through the API gateway, the way the web client uses it.
+
+Every scenario records per-operation latency in a Recorder; a phase's throughput is
+its completed operations divided by the wall time of the phase.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+import websockets
+from sudoku import Sudoku
+
+WS_TIMEOUT = 15.0  # Seconds to wait for an expected WebSocket message
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def add(self, latency: float):
+        self.latencies.append(latency)
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+
+    async def call(self, request: Awaitable[httpx.Response]) -> Optional[httpx.Response]:
+        """
+        Awaits an HTTP request, recording its latency or the kind of failure.
+        """
+        start = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            self.error(type(e).__name__)
+            return None
+        if response.status_code >= 400:
+            self.error(f"http_{response.status_code}")
+            return None
+        self.add(time.perf_counter() - start)
+        return response
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        duration = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        to_ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "operations": len(ordered),
+            "errors": sum(self.errors.values()),
+            "error_kinds": dict(self.errors),
+            "duration_s": round(duration, 3),
+            "throughput_ops": round(len(ordered) / duration, 2) if duration > 0 else 0.0,
+            "latency_ms": {
+                "mean": to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+                "p50": to_ms(percentile(ordered, 50)),
+                "p95": to_ms(percentile(ordered, 95)),
+                "p99": to_ms(percentile(ordered, 99)),
+                "max": to_ms(ordered[-1]) if ordered else 0.0,
+            },
+        }
+
+
+async def bounded(items: Iterable[Any], concurrency: int, worker: Callable[[Any], Awaitable[Any]]) -> List[Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await worker(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+class LoadTest:
+    def __init__(self, base_url: str, concurrency: int, run_id: str):
+        self.base_url = base_url.rstrip("/")
+        self.ws_url = "ws" + self.base_url[len("http"):]
+        self.concurrency = concurrency
+        self.run_id = run_id
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2),
+        )
+        self.tokens: Dict[str, str] = {}
+        self.recorders: Dict[str, Recorder] = {}
+
+    def recorder(self, name: str) -> Recorder:
+        if name not in self.recorders:
+            self.recorders[name] = Recorder(name)
+        return self.recorders[name]
+
+    def auth(self, username: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    async def close(self):
+        await self.client.aclose()
+
+    # --- Registration and login storm ---
+
+    async def register_and_login(self, usernames: List[str]):
+        register, login = self.recorder("register"), self.recorder("login")
+        register.start()
+        login.start()
+
+        async def user_flow(username: str):
+            password = f"pw-{username}"
+            response = await register.call(self.client.post(
+                "/game_service/register", json={"username": username, "password": password}
+            ))
+            if response is None:
+                return
+            response = await login.call(self.client.post(
+                "/game_service/login", data={"username": username, "password": password}
+            ))
+            if response is not None:
+                self.tokens[username] = response.json()["access_token"]
+
+        await bounded(usernames, self.concurrency, user_flow)
+        register.finish()
+        login.finish()
+
+    # --- Lobby creation ---
+
+    async def create_lobbies(self, pairs: List[Tuple[str, str]]) -> List[Tuple[str, str, str]]:
+        recorder = self.recorder("create_lobby")
+        recorder.start()
+
+        async def create(pair: Tuple[str, str]) -> Optional[Tuple[str, str, str]]:
+            owner, opponent = pair
+            if owner not in self.tokens or opponent not in self.tokens:
+                return None
+            response = await recorder.call(self.client.post(
+                "/lobbies", json={"gameId": f"{self.run_id}-{owner}"}, headers=self.auth(owner)
+            ))
+            return (response.json()["lobbyId"], owner, opponent) if response is not None else None
+
+        lobbies = [lobby for lobby in await bounded(pairs, self.concurrency, create) if lobby is not None]
+        recorder.finish()
+        return lobbies
+
+    # --- Two-player games: chat burst followed by a full board ---
+
+    async def play_games(self, lobbies: List[Tuple[str, str, str]], chat_messages: int):
+        chat, move, game = self.recorder("ws_chat"), self.recorder("ws_move"), self.recorder("full_game")
+        for recorder in (chat, move, game):
+            recorder.start()
+
+        async def play(lobby: Tuple[str, str, str]):
+            start = time.perf_counter()
+            try:
+                await self.play_game(*lobby, chat_messages=chat_messages, chat=chat, move=move)
+            except asyncio.TimeoutError:
+                game.error("timeout")
+            except Exception as e:
+                game.error(type(e).__name__)
+            else:
+                game.add(time.perf_counter() - start)
+
+        # Each game holds two connections
+        await bounded(lobbies, max(1, self.concurrency // 2), play)
+        for recorder in (chat, move, game):
+            recorder.finish()
+
+    async def play_game(self, lobby_id: str, owner: str, opponent: str, chat_messages: int,
+                        chat: Recorder, move: Recorder):
+        response = await self.client.get(f"/lobbies/{lobby_id}", headers=self.auth(owner))
+        response.raise_for_status()
+        board = response.json()["board"]
+        solution = solve(board)
+
+        async with websockets.connect(f"{self.ws_url}/ws/lobby/{lobby_id}?token={self.tokens[owner]}") as first:
+            async with websockets.connect(f"{self.ws_url}/ws/lobby/{lobby_id}?token={self.tokens[opponent]}") as second:
+                players = [(owner, first), (opponent, second)]
+                if chat_messages:
+                    await asyncio.gather(*(
+                        self.chat_burst(username, ws, chat_messages, 2 * chat_messages, chat)
+                        for username, ws in players
+                    ))
+
+                empty = [(r, c) for r in range(9) for c in range(9) if cell_value(board[r][c]) == 0]
+                for turn, (row, col) in enumerate(empty):
+                    username, mover = players[turn % 2]
+                    _, other = players[(turn + 1) % 2]
+                    start = time.perf_counter()
+                    await mover.send(json.dumps({
+                        "type": "move", "player": username, "row": row, "col": col, "value": solution[row][col],
+                    }))
+                    reply = await receive_until(mover, {"move", "game_over", "error"})
+                    if reply["type"] == "error":
+                        move.error("rejected")
+                        continue
+                    move.add(time.perf_counter() - start)
+                    await receive_until(other, {"move", "game_over"})
+
+    async def chat_burst(self, username: str, ws, count: int, expected: int, recorder: Recorder):
+        """
+        Sends count chat messages without waiting and measures when each one comes back
+        in the broadcast; reads until all expected chats of both players have arrived.
+        """
+        sent: Dict[str, float] = {}
+        for i in range(count):
+            text = f"{self.run_id}:{username}:{i}"
+            sent[text] = time.perf_counter()
+            await ws.send(json.dumps({"type": "chat", "player": username, "message": text}))
+        received = 0
+        while received < expected:
+            message = await receive_until(ws, {"chat"})
+            received += 1
+            sent_at = sent.pop(message.get("message"), None)
+            if sent_at is not None:
+                recorder.add(time.perf_counter() - sent_at)
+        for _ in sent:
+            recorder.error("lost")
+
+    # --- History and lobby list reads ---
+
+    async def read_history(self, usernames: List[str], reads: int):
+        games, chat_history, lobby_list = (
+            self.recorder("user_games"), self.recorder("chat_history"), self.recorder("lobby_list")
+        )
+        for recorder in (games, chat_history, lobby_list):
+            recorder.start()
+        known = [username for username in usernames if username in self.tokens]
+        rng = random.Random(0)
+
+        async def read(_):
+            username = rng.choice(known)
+            headers = self.auth(username)
+            response = await games.call(self.client.get(f"/users/{username}/games", headers=headers))
+            if response is not None and response.json():
+                game_id = response.json()[0]["id"]
+                await chat_history.call(self.client.get(f"/games/{game_id}/chat_history", headers=headers))
+            await lobby_list.call(self.client.get("/lobbies", params={"view": "summary", "limit": 50}, headers=headers))
+
+        if known:
+            await bounded(range(reads), self.concurrency, read)
+        for recorder in (games, chat_history, lobby_list):
+            recorder.finish()
+
+
+def cell_value(cell: Any) -> int:
+    if isinstance(cell, dict):
+        return cell.get("value") or 0
+    return cell or 0
+
+
+def solve(board: List[List[Any]]) -> List[List[int]]:
+    puzzle = Sudoku(3, 3, board=[[cell_value(cell) or None for cell in row] for row in board])
+    return puzzle.solve().board
+
+
+async def receive_until(ws, types: Set[str]) -> Dict[str, Any]:
+    """
+    Returns the next message of one of the given types, skipping system messages
+    and broadcasts the caller is not waiting for.
+    """
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), WS_TIMEOUT))
+        if message.get("type") in types:
+            return message
@@ -0,0 +1,45 @@
+"""
+Starts one service under uvicorn for the load-test harness.
+
+With --fake-redis, redis.asyncio.Redis is replaced by an in-process fakeredis
+server, so the stack can run without a Redis server. Everything else (database
+URL, upstream URLs, limits) comes from the environment set by stack.py.
+
+    python loadtest/serve.py lobby-service --port 5002 [--fake-redis]
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("service_dir")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--fake-redis", action="store_true")
+    args = parser.parse_args()
+
+    service_dir = os.path.abspath(args.service_dir)
+    os.chdir(service_dir)
+    sys.path.insert(0, service_dir)
+
+    if args.fake_redis:
+        import fakeredis
+        import redis.asyncio
+
+        server = fakeredis.FakeServer()
+
+        def fake_redis(*_args, **kwargs):
+            return fakeredis.FakeAsyncRedis(server=server, decode_responses=kwargs.get("decode_responses", False))
+
+        redis.asyncio.Redis = fake_redis
+
+    import main as service
+
+    uvicorn.run(service.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Starts game-service, lobby-service and the API gateway as local processes.
+
+By default every service uses its own SQLite database in the work directory and
+an in-process fakeredis, so no Postgres or Redis is required. Pass database URLs
+and a Redis host to run against real (e.g. docker-compose) backing services.
+Services with a schema are migrated with `alembic upgrade head` before they start.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVE = os.path.join(ROOT, "loadtest", "serve.py")
+
+# Gateway rate limits are per client; the harness drives many users from one IP
+# and would otherwise measure the limiter instead of the services
+RATE_LIMIT_RULES = ("login", "register", "game_service", "create_lobby", "lobby_list", "matchmaking", "websocket", "default")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Service:
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        port: int,
+        env: Dict[str, str],
+        log_path: str,
+        fake_redis: bool,
+        migrate: bool = False,
+        ready_path: str = "/ready",
+    ):
+        self.name = name
+        self.directory = directory
+        self.port = port
+        self.env = env
+        self.log_path = log_path
+        self.fake_redis = fake_redis
+        self.migrate = migrate
+        self.ready_path = ready_path
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def run_migrations(self):
+        result = subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=os.path.join(ROOT, self.directory),
+            env={**os.environ, **self.env},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{self.name} migrations failed with code {result.returncode}:\n{result.stdout}")
+
+    def start(self):
+        if self.migrate:
+            self.run_migrations()
+        command = [sys.executable, SERVE, os.path.join(ROOT, self.directory), "--port", str(self.port)]
+        if self.fake_redis:
+            command.append("--fake-redis")
+        log = open(self.log_path, "w")
+        self.process = subprocess.Popen(command, env={**os.environ, **self.env}, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+    def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with code {self.process.returncode}:\n{self.log_tail()}")
+            try:
+                # /ready answers 503 until the service has warmed up
+                if httpx.get(f"{self.url}{self.ready_path}", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.name} did not become ready in {timeout} s:\n{self.log_tail()}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def log_tail(self, lines: int = 20) -> str:
+        with open(self.log_path, errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+
+
+class Stack:
+    def __init__(
+        self,
+        workdir: str,
+        game_db_url: Optional[str] = None,
+        lobby_db_url: Optional[str] = None,
+        redis_host: Optional[str] = None,
+        keep_rate_limits: bool = False,
+        extra_env: Optional[Dict[str, str]] = None,
+    ):
+        os.makedirs(workdir, exist_ok=True)
+        # Every run starts from empty SQLite databases
+        for name in ("game.db", "lobby.db"):
+            path = os.path.join(workdir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        fake_redis = redis_host is None
+        common = {"LOG_LEVEL": "WARNING", "SQL_ECHO": "false", **(extra_env or {})}
+        if redis_host is not None:
+            common["REDIS_HOST"] = redis_host
+
+        game_port, lobby_port, gateway_port = free_port(), free_port(), free_port()
+        game_url = f"http://127.0.0.1:{game_port}/"
+        gateway_env = {
+            **common,
+            "GAME_SERVICE1_URL": game_url,
+            "GAME_SERVICE2_URL": game_url,
+            "GAME_SERVICE3_URL": game_url,
+            "LOBBY_SERVICE_URL": f"http://127.0.0.1:{lobby_port}/",
+        }
+        if not keep_rate_limits:
+            gateway_env.update({f"RATE_LIMIT_{name.upper()}": "100000:100000" for name in RATE_LIMIT_RULES})
+
+        self.services: List[Service] = [
+            Service("game-service", "game-service", game_port, {
+                **common,
+                "INSTANCE_NAME": "loadtest",
+                "DATABASE_URL": game_db_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'game.db')}",
+            }, os.path.join(workdir, "game-service.log"), fake_redis, migrate=True),
+            Service("lobby-service", "lobby-service", lobby_port, {
+                **common,
+                "DATABASE_URL": lobby_db_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'lobby.db')}",
+            }, os.path.join(workdir, "lobby-service.log"), fake_redis, migrate=True),
+            # The gateway has no /ready of its own
+            Service("api-gateway", "api-gateway", gateway_port, gateway_env,
+                    os.path.join(workdir, "api-gateway.log"), fake_redis, ready_path="/metrics"),
+        ]
+
+    @property
+    def gateway_url(self) -> str:
+        return self.services[-1].url
+
+    def start(self, timeout: float = 60.0):
+        try:
+            for service in self.services:
+                service.start()
+            for service in self.services:
+                service.wait_ready(timeout)
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        for service in reversed(self.services):
+            service.stop()
+
+    def __enter__(self) -> "Stack":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
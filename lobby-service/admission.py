@@ -0,0 +1,194 @@
+# admission.py
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """
+    Запрос отклонён без выполнения: очередь переполнена (429) или ожидание истекло (503).
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Ограничивает число одновременно выполняемых запросов одного класса маршрутов.
+
+    Сверх лимита запросы ждут в очереди ограниченной длины не дольше queue_timeout.
+    Лимит адаптивный (AIMD): пока задержка не превышает target_latency и лимит
+    исчерпан, он растёт на 1/limit за каждый запрос; при превышении уменьшается
+    в backoff раз, но не чаще раза в decrease_interval секунд.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        queue_size: int = 64,
+        queue_timeout: float = 2.0,
+        target_latency: float = 0.5,
+        backoff: float = 0.9,
+        decrease_interval: float = 1.0,
+        adaptive: bool = True,
+    ):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.decrease_interval = decrease_interval
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.latency = 0.0  # Экспоненциальное скользящее среднее задержки
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def try_acquire(self) -> bool:
+        """
+        Занимает слот без ожидания. Используется для WebSocket, где очередь не имеет смысла.
+        """
+        if self._take():
+            self.stats["admitted"] += 1
+            return True
+        self.stats["rejected_full"] += 1
+        return False
+
+    async def acquire(self):
+        if self._take():
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.stats["rejected_full"] += 1
+            raise AdmissionRejected(429, "Too many requests", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(future)
+            self.stats["rejected_timeout"] += 1
+            raise AdmissionRejected(503, "Service is overloaded", self.retry_after())
+        except asyncio.CancelledError:
+            # Клиент ушёл во время ожидания; если слот уже выдан, возвращаем его
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self._discard(future)
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self, latency: Optional[float] = None):
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def retry_after(self) -> int:
+        """
+        Оценка в секундах, через сколько очередь успеет разойтись.
+        """
+        per_request = self.latency or self.target_latency
+        backlog = len(self._waiters) + self.in_flight
+        return max(1, math.ceil(backlog * per_request / max(1, int(self.limit))))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_length": len(self._waiters),
+            "latency_ms": round(self.latency * 1000, 1),
+        }
+
+    async def dependency(self) -> AsyncGenerator[None, None]:
+        """
+        FastAPI-зависимость: держит слот на время обработки запроса.
+        """
+        try:
+            await self.acquire()
+        except AdmissionRejected as e:
+            logger.warning("Запрос класса %s отклонён: %s", self.name, e.detail)
+            raise HTTPException(
+                status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)}
+            )
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def _observe(self, latency: float):
+        self.latency = latency if self.latency == 0 else 0.9 * self.latency + 0.1 * latency
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.decrease_interval:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                logger.info("Лимит класса %s снижен до %s (задержка %.3f с)", self.name, int(self.limit), latency)
+        elif self.in_flight + 1 >= int(self.limit):
+            # Растём только когда лимит действительно упирается в нагрузку
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _take(self) -> bool:
+        # Очередь соблюдается: пока есть ожидающие, новые запросы слот не получают
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def _discard(self, future: asyncio.Future):
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+
+def controller_from_env(name: str, **defaults) -> AdmissionController:
+    """
+    Создаёт контроллер, позволяя переопределить параметры переменными окружения
+    ADMISSION_<NAME>_LIMIT, _MAX_LIMIT, _QUEUE_SIZE, _QUEUE_TIMEOUT и _TARGET_LATENCY.
+    """
+    prefix = f"ADMISSION_{name.upper()}_"
+    options = dict(defaults)
+    for option, cast in (
+        ("limit", int),
+        ("max_limit", int),
+        ("queue_size", int),
+        ("queue_timeout", float),
+        ("target_latency", float),
+    ):
+        value = os.environ.get(prefix + option.upper())
+        if value is not None:
+            options[option] = cast(value)
+    return AdmissionController(name, **options)
@@ -0,0 +1,45 @@
+# alembic/env.py
+import asyncio
+import os
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import async_engine_from_config
+from sqlalchemy.engine import Connection
+
+from alembic import context
+from models import metadata  # Таблицы сервиса
+
+config = context.config
+fileConfig(config.config_file_name)
+
+# DATABASE_URL сервиса важнее sqlalchemy.url из alembic.ini
+if os.environ.get("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
+
+target_metadata = metadata
+
+def run_migrations_online():
+    configuration = config.get_section(config.config_ini_section)
+    connectable = async_engine_from_config(
+        configuration,
+        prefix='sqlalchemy.',
+        poolclass=pool.NullPool,
+    )
+
+    async def do_run_migrations():
+        async with connectable.connect() as connection:
+            await connection.run_sync(run_migrations)
+
+    def run_migrations(connection: Connection):
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+    asyncio.run(do_run_migrations())
+
+run_migrations_online()
@@ -0,0 +1,91 @@
+# benchmarks/bench_lobby_memory.py
+"""
+Сравнивает память, которую занимает лобби в середине партии: прежнее представление
+(словарь с pydantic-моделями игроков и доской из вложенных списков с клетками-словарями)
+и классы со __slots__ из game_state.py (доска — два bytearray по 81 байту).
+
+Запуск из каталога lobby-service:
+    python benchmarks/bench_lobby_memory.py [--lobbies 2000] [--filled 0.5]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sudoku import Sudoku
+
+from board_generator import export_as_list
+from game_state import Board, Lobby, LobbyPlayer
+from main import Player
+
+
+def played_board(seed: int, filled: float) -> List[List[int]]:
+    puzzle = Sudoku(3, seed=seed).difficulty(0.5)
+    solution = puzzle.solve().board
+    board = export_as_list(puzzle)
+    empty = [(r, c) for r in range(9) for c in range(9) if board[r][c] == 0]
+    for i, (r, c) in enumerate(empty[:int(len(empty) * filled)]):
+        board[r][c] = {"value": solution[r][c], "owner": "alice" if i % 2 == 0 else "bob"}
+    return board
+
+
+def dict_lobby(rows: List[List], seed: int) -> Dict:
+    # Копии клеток: у каждого лобби свои словари, как после ходов игроков
+    return {
+        "gameId": f"game-{seed}",
+        "players": [
+            Player(player_id=str(uuid.uuid4()), name="alice", color="red"),
+            Player(player_id=str(uuid.uuid4()), name="bob", color="blue"),
+        ],
+        "board": [[dict(cell) if isinstance(cell, dict) else cell for cell in row] for row in rows],
+        "scores": {"alice": 10, "bob": 9},
+        "finished": False,
+        "reserved": None,
+        "dbId": seed,
+        "seq": 40,
+    }
+
+
+def slotted_lobby(rows: List[List], seed: int) -> Lobby:
+    lobby = Lobby(f"game-{seed}", Board.from_rows(rows), scores={"alice": 10, "bob": 9}, db_id=seed, seq=40)
+    lobby.players = [
+        LobbyPlayer(player_id=str(uuid.uuid4()), name="alice", color="red"),
+        LobbyPlayer(player_id=str(uuid.uuid4()), name="bob", color="blue"),
+    ]
+    return lobby
+
+
+def measure(build: Callable[[List[List], int], object], boards: List[List[List]]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lobbies = [build(rows, seed) for seed, rows in enumerate(boards)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(lobbies) == len(boards)
+    return (after - before) / len(boards)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lobbies", type=int, default=2000)
+    parser.add_argument("--filled", type=float, default=0.5, help="доля пустых клеток, заполненных игроками")
+    args = parser.parse_args()
+
+    templates = [played_board(seed, args.filled) for seed in range(20)]
+    boards = [templates[i % len(templates)] for i in range(args.lobbies)]
+    before = measure(dict_lobby, boards)
+    after = measure(slotted_lobby, boards)
+    print(f"{'representation':<30}{'bytes per lobby':>18}")
+    print(f"{'dict + pydantic + nested list':<30}{before:>18.0f}")
+    print(f"{'__slots__ + bytearray':<30}{after:>18.0f}")
+    print(f"reduction: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
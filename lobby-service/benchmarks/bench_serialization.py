@@ -0,0 +1,136 @@
+# benchmarks/bench_serialization.py
+"""
+Сравнивает стоимость сериализации до и после перехода на orjson и отказа от повторной валидации.
+
+Запуск из каталога lobby-service:
+    python benchmarks/bench_serialization.py [--lobbies 100] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sudoku import Sudoku
+
+import serialization
+from board_generator import export_as_list
+from game_state import Board, Lobby, LobbyPlayer
+from main import GameResultResponse, LobbyDetailsResponse, lobby_details
+
+
+def make_lobby(seed: int) -> Lobby:
+    board = export_as_list(Sudoku(3, seed=seed).difficulty(0.5))
+    # Половину пустых клеток считаем заполненными игроками
+    filled = 0
+    for r in range(9):
+        for c in range(9):
+            if board[r][c] == 0 and filled % 2 == 0:
+                board[r][c] = {"value": (r + c) % 9 + 1, "owner": "alice" if filled % 4 == 0 else "bob"}
+            filled += 1
+    lobby = Lobby(f"game-{seed}", Board.from_rows(board), scores={"alice": 10, "bob": 9})
+    lobby.players = [
+        LobbyPlayer(player_id=f"p1-{seed}", name="alice", color="red"),
+        LobbyPlayer(player_id=f"p2-{seed}", name="bob", color="blue"),
+    ]
+    return lobby
+
+
+def make_history(count: int) -> List[dict]:
+    start = datetime(2024, 10, 1, 12, 0, 0)
+    return [
+        {
+            "id": i,
+            "lobby_id": f"lobby-{i}",
+            "game_id": f"game-{i}",
+            "start_time": start + timedelta(minutes=i),
+            "end_time": start + timedelta(minutes=i + 15),
+            "winner": "alice" if i % 2 else "bob",
+        }
+        for i in range(count)
+    ]
+
+
+def fastapi_json_dumps(content) -> bytes:
+    # Так JSONResponse FastAPI сериализует ответ по умолчанию
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lobbies", type=int, default=100)
+    parser.add_argument("--history", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    lobbies = {f"lobby-{i}": make_lobby(i) for i in range(args.lobbies)}
+    history = make_history(args.history)
+    lobby_list_adapter = TypeAdapter(List[LobbyDetailsResponse])
+    history_adapter = TypeAdapter(List[GameResultResponse])
+    any_lobby_id, any_lobby = next(iter(lobbies.items()))
+
+    def lobbies_before():
+        models = [
+            LobbyDetailsResponse(
+                lobbyId=lobby_id,
+                gameId=lobby.game_id,
+                players=[player.as_dict() for player in lobby.players],
+                board=lobby.board.to_wire(),
+                scores=lobby.scores,
+            )
+            for lobby_id, lobby in lobbies.items()
+        ]
+        # serialize_response: валидация по response_model и дамп в JSON-совместимые объекты
+        validated = lobby_list_adapter.validate_python(models, from_attributes=True)
+        return fastapi_json_dumps(lobby_list_adapter.dump_python(validated, mode="json"))
+
+    def lobbies_after():
+        return serialization.dumps([lobby_details(lobby_id, lobby) for lobby_id, lobby in lobbies.items()])
+
+    def broadcast_before():
+        return json.dumps({
+            "type": "move",
+            "message": "alice сделал ход.",
+            "board": jsonable_encoder(any_lobby.board.to_wire()),
+            "scores": any_lobby.scores,
+        })
+
+    def broadcast_after():
+        return serialization.dumps_str({
+            "type": "move",
+            "message": "alice сделал ход.",
+            "board": any_lobby.board.to_wire(),
+            "scores": any_lobby.scores,
+        })
+
+    def history_before():
+        models = [GameResultResponse(**game) for game in history]
+        validated = history_adapter.validate_python(models, from_attributes=True)
+        return fastapi_json_dumps(history_adapter.dump_python(validated, mode="json"))
+
+    def history_after():
+        return serialization.dumps(history)
+
+    cases = [
+        (f"GET /lobbies ({args.lobbies} lobbies)", lobbies_before, lobbies_after),
+        ("move broadcast payload", broadcast_before, broadcast_after),
+        (f"GET /users/{{username}}/games ({args.history} rows)", history_before, history_after),
+    ]
+
+    backend = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"serializer: {backend}")
+    print(f"{'case':<45}{'before, us':>14}{'after, us':>14}{'speedup':>10}")
+    for name, before, after in cases:
+        before_us = min(timeit.repeat(before, number=args.repeat, repeat=3)) / args.repeat * 1e6
+        after_us = min(timeit.repeat(after, number=args.repeat, repeat=3)) / args.repeat * 1e6
+        print(f"{name:<45}{before_us:>14.1f}{after_us:>14.1f}{before_us / after_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/conftest.py
+"""
+Общие данные для микробенчмарков игровой логики: доски с фиксированным seed
+и разной степенью заполнения, чтобы результаты были сравнимы между запусками.
+
+Запуск из каталога lobby-service:
+    python -m pytest benchmarks                      # результаты сохраняются в benchmarks/.benchmarks
+    python -m pytest benchmarks --benchmark-compare  # сравнение с последним сохранённым запуском
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+import copy
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import pytest
+from sudoku import Sudoku
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from board_generator import export_as_list
+from game_state import Board
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORAGE = "file://./.benchmarks"
+
+SEED = 20241001
+# Доля пустых клеток исходной доски (аргумент Sudoku.difficulty)
+FILL_LEVELS = {"easy": 0.1, "medium": 0.5, "hard": 0.8}
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Базовые результаты хранятся рядом с бенчмарками независимо от текущего каталога
+    if config.getoption("benchmark_storage", None) == DEFAULT_STORAGE:
+        config.option.benchmark_storage = f"file://{os.path.join(BENCHMARKS_DIR, '.benchmarks')}"
+
+
+def make_board(difficulty: float, player_share: float = 0.0, seed: int = SEED) -> Tuple[Board, List[List[int]]]:
+    """
+    Доска лобби и её решение. player_share — доля пустых клеток, уже заполненных
+    игроками (клетки с владельцем, как после ходов).
+    """
+    puzzle = Sudoku(3, seed=seed).difficulty(difficulty)
+    solution = puzzle.solve().board
+    board = Board.from_rows(export_as_list(puzzle))
+    empty = empty_cells(board)
+    for i, (r, c) in enumerate(empty[:int(len(empty) * player_share)]):
+        board.place(r, c, solution[r][c], "alice" if i % 2 == 0 else "bob")
+    return board, solution
+
+
+def empty_cells(board: Board) -> List[Tuple[int, int]]:
+    return [divmod(index, 9) for index, value in enumerate(board.values) if value == 0]
+
+
+@pytest.fixture(params=list(FILL_LEVELS), scope="session")
+def level(request) -> str:
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def boards() -> Dict[Tuple[str, float], Tuple[Board, List[List[int]]]]:
+    """
+    Доски для всех уровней: только что созданная (0.0) и наполовину сыгранная (0.5).
+    """
+    return {
+        (name, share): make_board(difficulty, share)
+        for name, difficulty in FILL_LEVELS.items()
+        for share in (0.0, 0.5)
+    }
+
+
+@pytest.fixture
+def fresh_board(boards, level) -> Tuple[Board, List[List[int]]]:
+    board, solution = boards[(level, 0.0)]
+    return copy.deepcopy(board), solution
+
+
+@pytest.fixture
+def played_board(boards, level) -> Tuple[Board, List[List[int]]]:
+    board, solution = boards[(level, 0.5)]
+    return copy.deepcopy(board), solution
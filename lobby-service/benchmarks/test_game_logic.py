@@ -0,0 +1,120 @@
+# benchmarks/test_game_logic.py
+"""
+Микробенчмарки функций, которые выполняются на каждый ход или при создании лобби.
+"""
+import copy
+
+import pytest
+from sudoku import Sudoku
+
+import board_generator
+from board_generator import export_as_list
+from conftest import FILL_LEVELS, SEED, empty_cells, make_board
+from game_state import Board
+from main import check_game_over, is_valid_move
+from protocol import JSON_CODEC, MSGPACK_CODEC
+
+
+def move_payload(board, scores):
+    # То же сообщение, что рассылается игрокам лобби после принятого хода
+    return {
+        "type": "move",
+        "message": "alice сделал ход.",
+        "board": board.to_wire(),
+        "scores": scores,
+    }
+
+
+def test_is_valid_move_accepted(benchmark, played_board):
+    # Допустимый ход проверяет строку, столбец и блок целиком — худший случай
+    board, solution = played_board
+    row, col = empty_cells(board)[0]
+    valid, _ = benchmark(is_valid_move, board, row, col, solution[row][col])
+    assert valid
+
+
+def test_is_valid_move_conflict(benchmark, played_board):
+    board, solution = played_board
+    row, col = empty_cells(board)[0]
+    # Значение из той же строки: отказ находится уже при проверке строки
+    taken = next(value for value in board.values[row * 9:row * 9 + 9] if value)
+    valid, _ = benchmark(is_valid_move, board, row, col, taken)
+    assert not valid
+
+
+def test_check_game_over_in_progress(benchmark, played_board):
+    board, _ = played_board
+    game_over, _ = benchmark(check_game_over, board)
+    assert not game_over
+
+
+def test_check_game_over_solved(benchmark, level):
+    # Заполненная доска просматривается целиком
+    board, _ = make_board(FILL_LEVELS[level], player_share=1.0)
+    game_over, _ = benchmark(check_game_over, board)
+    assert game_over
+
+
+def test_board_to_wire(benchmark, played_board):
+    board, _ = played_board
+    result = benchmark(board.to_wire)
+    restored = Board.from_rows(result)
+    assert (restored.values, restored.owners, restored.seats) == (board.values, board.owners, board.seats)
+
+
+@pytest.mark.parametrize("codec", [JSON_CODEC, MSGPACK_CODEC], ids=["json", "msgpack"])
+def test_encode_move_broadcast(benchmark, played_board, codec):
+    board, _ = played_board
+    scores = {"alice": 12, "bob": 11}
+    frame = benchmark(lambda: codec.encode(move_payload(board, scores)))
+    assert frame
+
+
+@pytest.mark.parametrize("difficulty", list(FILL_LEVELS.values()), ids=list(FILL_LEVELS))
+def test_generate_sudoku_board(benchmark, difficulty):
+    # Случайный seed внутри функции: время зависит от доски, смотреть на медиану
+    board = benchmark(board_generator.generate_sudoku_board, difficulty)
+    assert len(board) == 9
+
+
+@pytest.mark.parametrize("difficulty", list(FILL_LEVELS.values()), ids=list(FILL_LEVELS))
+def test_generate_fixed_seed(benchmark, difficulty):
+    board = benchmark(lambda: export_as_list(Sudoku(3, seed=SEED).difficulty(difficulty)))
+    assert len(board) == 9
+
+
+def test_export_as_list(benchmark):
+    puzzle = Sudoku(3, seed=SEED).difficulty(0.5)
+    board = benchmark(export_as_list, puzzle)
+    assert len(board) == 9
+
+
+def play_full_game(board, solution):
+    """
+    Повторяет обработку ходов в lobby_session: проверка, запись клетки, проверка
+    конца игры и кодирование рассылки, пока доска не будет решена.
+    """
+    scores = {"alice": 0, "bob": 0}
+    players = ("alice", "bob")
+    game_over = False
+    for turn, (row, col) in enumerate(empty_cells(board)):
+        player = players[turn % 2]
+        valid, _ = is_valid_move(board, row, col, solution[row][col])
+        if not valid:
+            continue
+        board.place(row, col, solution[row][col], player)
+        scores[player] += 1
+        game_over, _ = check_game_over(board)
+        JSON_CODEC.encode(move_payload(board, scores))
+    return game_over
+
+
+def test_full_game(benchmark, fresh_board):
+    board, solution = fresh_board
+    game_over = benchmark.pedantic(
+        play_full_game,
+        setup=lambda: ((copy.deepcopy(board), solution), {}),
+        rounds=50,
+        warmup_rounds=2,
+    )
+    assert game_over
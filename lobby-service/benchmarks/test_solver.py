@@ -0,0 +1,79 @@
+# benchmarks/test_solver.py
+"""
+Микробенчмарки решателя: решение и проверка единственности досок из conftest и
+известных трудных задач, сравнение движков solver.py с Sudoku.solve из py-sudoku.
+"""
+import pytest
+from sudoku import Sudoku
+
+from conftest import FILL_LEVELS, SEED, make_board
+from solver import ENGINES, count_solutions, find_hint, make_unique, solve, solve_batch
+
+# Трудные задачи с единственным решением: одиночек почти нет, нужен перебор
+HARD_PUZZLES = {
+    "platinum": "000000010400000000020000000000050407008000300001090000300400200050100000000806000",
+    "inkala": "800000000003600000070090200050007000000045700000100030001000068008500010090000400",
+    "norvig": "400000805030000000000700000020000060000080400000010000000603070500200000104000000",
+}
+
+
+def givens(board):
+    return bytes(board.values)
+
+
+@pytest.fixture(scope="module")
+def unique_boards():
+    # Доски из пула всегда с единственным решением, как после generate_sudoku_board
+    return {name: bytes(make_unique(givens(make_board(difficulty)[0]))[0]) for name, difficulty in FILL_LEVELS.items()}
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+def test_solve(benchmark, unique_boards, level, engine):
+    solution = benchmark(solve, unique_boards[level], engine)
+    assert solution is not None and 0 not in solution
+
+
+def test_solve_py_sudoku(benchmark, unique_boards, level):
+    board = unique_boards[level]
+    rows = [list(board[start:start + 9]) for start in range(0, 81, 9)]
+    solved = benchmark(lambda: Sudoku(3, 3, board=rows).solve())
+    assert solved.validate()
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+@pytest.mark.parametrize("puzzle", list(HARD_PUZZLES))
+def test_solve_hard(benchmark, puzzle, engine):
+    solution = benchmark(solve, HARD_PUZZLES[puzzle], engine)
+    assert solution is not None
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+def test_count_solutions_unique(benchmark, unique_boards, level, engine):
+    # Проверка единственности: поиск проходит всё дерево, второго решения нет
+    assert benchmark(count_solutions, unique_boards[level], 2, engine) == 1
+
+
+def test_count_solutions_early_exit(benchmark):
+    # Доска py-sudoku с 65 пустыми клетками: поиск останавливается на втором решении
+    board, _ = make_board(FILL_LEVELS["hard"])
+    assert benchmark(count_solutions, givens(board)) == 2
+
+
+def test_make_unique(benchmark):
+    board, _ = make_board(FILL_LEVELS["hard"])
+    values, solution = benchmark(make_unique, givens(board))
+    assert count_solutions(values) == 1 and 0 not in solution
+
+
+def test_solve_batch(benchmark):
+    # Проверка банка задач: 50 досок средней сложности за вызов
+    boards = [givens(make_board(FILL_LEVELS["medium"], seed=SEED + i)[0]) for i in range(50)]
+    results = benchmark(solve_batch, boards)
+    assert len(results) == 50 and all(count >= 1 for count, _ in results)
+
+
+def test_find_hint(benchmark, unique_boards):
+    board = unique_boards["medium"]
+    solution = solve(board)
+    index, value, reason = benchmark(find_hint, board, solution)
+    assert reason == "empty" and board[index] == 0 and solution[index] == value
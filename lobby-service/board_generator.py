@@ -3,6 +3,9 @@ from sudoku import Sudoku
 from typing import List, Dict, Optional, Union
 import random
 
+from solver import make_unique
+from tracing import tracer
+
 def export_as_list(puzzle) -> List[List[Union[int, None]]]:
     """
     Экспортирует доску Sudoku в виде списка списков.
@@ -13,13 +16,15 @@ def export_as_list(puzzle) -> List[List[Union[int, None]]]:
 
 def generate_sudoku_board(difficulty=0.1):
     """
-    Возвращает случайно выбранную предгенерированную доску Sudoku с заданной сложностью.
+    Возвращает случайно сгенерированную доску Sudoku с заданной сложностью.
     Каждая клетка представлена либо числом (предзаполненная клетка), либо 0 (пустая клетка).
+    py-sudoku убирает клетки случайно и не гарантирует единственность решения, поэтому
+    доска проверяется решателем и при нескольких решениях получает недостающие подсказки.
     """
-    # Каждый раз создается новый объект Sudoku
-    random.seed()
-    x = random.randint(0, 14112002)
-    print(x)
-    puzzle = Sudoku(3, seed=x).difficulty(difficulty)
-    board = export_as_list(puzzle)
-    return board
+    with tracer.span("board.generate", difficulty=difficulty):
+        # Каждый раз создается новый объект Sudoku
+        random.seed()
+        x = random.randint(0, 14112002)
+        puzzle = Sudoku(3, seed=x).difficulty(difficulty)
+        values, _ = make_unique(export_as_list(puzzle))
+        return [values[start:start + 9] for start in range(0, 81, 9)]
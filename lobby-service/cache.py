@@ -0,0 +1,333 @@
+# cache.py
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from redis.exceptions import RedisError, ResponseError
+
+import serialization
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+# Снимает блокировку, только если она всё ещё принадлежит нам
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# События, после которых локальные копии ключа должны быть удалены на всех репликах.
+# Запись нового значения в keyspace-уведомлениях не учитывается: по ним не отличить свою
+# запись от чужой, и реплика удаляла бы только что заполненный L1. Вместо этого RedisCache
+# публикует ключ в INVALIDATION_CHANNEL вместе с идентификатором своего L1.
+INVALIDATION_EVENTS = ("del", "expired", "evicted")
+NOTIFY_KEYSPACE_EVENTS = "Egxe"
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class LocalCache:
+    """
+    Внутрипроцессный LRU-кэш с TTL (L1), хранит уже разобранные значения.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Отличает инвалидации, опубликованные этим процессом
+        self.origin = uuid.uuid4().hex
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return False, None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+async def listen_for_invalidations(redis_client, local_cache: LocalCache, reconnect_delay: float = 1.0):
+    """
+    Подписывается на keyspace-уведомления Redis и канал INVALIDATION_CHANNEL и удаляет
+    изменённые ключи из L1. Так redis_client.delete(...) или обновление значения на любой
+    реплике очищает локальные кэши остальных реплик.
+    """
+    db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+    channels = [f"__keyevent@{db}__:{event}" for event in INVALIDATION_EVENTS] + [INVALIDATION_CHANNEL]
+
+    try:
+        await redis_client.config_set("notify-keyspace-events", NOTIFY_KEYSPACE_EVENTS)
+    except ResponseError as e:
+        # Управляемый Redis может запрещать CONFIG SET — тогда уведомления включаются в его настройках
+        logger.warning("Не удалось включить keyspace-уведомления: %s", e)
+    except RedisError as e:
+        logger.warning("Redis недоступен при настройке keyspace-уведомлений: %s", e)
+
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(*channels)
+            logger.info("Подписка на инвалидацию L1-кэша установлена.")
+            async for message in pubsub.listen():
+                key = message["data"]
+                if message["channel"] == INVALIDATION_CHANNEL:
+                    origin, _, key = key.partition(":")
+                    if origin == local_cache.origin:
+                        # Своё обновление: L1 уже содержит новое значение
+                        continue
+                local_cache.invalidate(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Подписка на инвалидацию L1-кэша прервана: %s", e)
+        finally:
+            await pubsub.aclose()
+        # Пока подписки не было, часть инвалидаций могла потеряться
+        local_cache.clear()
+        await asyncio.sleep(reconnect_delay)
+
+
+class RedisCache:
+    """
+    Кэш поверх Redis с защитой от одновременной перезагрузки ключа (cache stampede).
+
+    Значение хранится в конверте {"value", "delta", "expires"}: "expires" — мягкий срок жизни,
+    после которого данные считаются устаревшими, но ещё отдаются клиентам (stale-while-revalidate),
+    пока одна из реплик обновляет их в фоне. Сам ключ в Redis живёт ttl + stale_ttl секунд.
+    Если передан local, свежие значения дополнительно кэшируются в памяти процесса (L1).
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        ttl: int = 300,
+        stale_ttl: int = 60,
+        beta: float = 1.0,
+        lock_timeout: float = 5.0,
+        lock_poll_interval: float = 0.05,
+        local: Optional[LocalCache] = None,
+    ):
+        self.redis = redis_client
+        self.local = local
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.beta = beta  # > 1 — обновлять раньше, < 1 — позже
+        self.lock_timeout = lock_timeout
+        self.lock_poll_interval = lock_poll_interval
+
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[str] = set()
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+        self.stats: Dict[str, int] = {
+            "l1_hits": 0,
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "early_refreshes": 0,
+            "refreshes": 0,
+            "lock_waits": 0,
+            "errors": 0,
+        }
+
+    async def get_or_load(self, key: str, loader: Loader, ttl: Optional[int] = None) -> Any:
+        """
+        Возвращает значение из кэша, при необходимости загружая его через loader.
+        loader должен возвращать JSON-сериализуемые данные и сам открывать сессию БД,
+        так как фоновое обновление может пережить исходный запрос.
+        """
+        ttl = ttl or self.ttl
+        if self.local is not None:
+            found, value = self.local.get(key)
+            if found:
+                self.stats["l1_hits"] += 1
+                return value
+
+        try:
+            with tracer.span("redis.get", key=key):
+                raw = await self.redis.get(key)
+        except RedisError as e:
+            self.stats["errors"] += 1
+            logger.error("Redis недоступен при чтении %s: %s", key, e)
+            return await loader()
+
+        entry = serialization.loads(raw) if raw is not None else None
+        # Записи старого формата (без конверта) считаем промахом
+        if isinstance(entry, dict) and "expires" in entry:
+            now = time.time()
+            if now < entry["expires"]:
+                self.stats["hits"] += 1
+                if self.local is not None:
+                    self.local.set(key, entry["value"], entry["expires"] - now)
+                if self._should_refresh_early(entry, now):
+                    self.stats["early_refreshes"] += 1
+                    self._refresh_in_background(key, loader, ttl)
+            else:
+                self.stats["stale_hits"] += 1
+                self._refresh_in_background(key, loader, ttl)
+            return entry["value"]
+
+        self.stats["misses"] += 1
+        return await self._single_flight(key, loader, ttl)
+
+    async def invalidate(self, key: str):
+        if self.local is not None:
+            self.local.invalidate(key)
+        await self.redis.delete(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Счётчики попаданий/промахов для мониторинга.
+        """
+        served = self.stats["l1_hits"] + self.stats["hits"] + self.stats["stale_hits"]
+        total = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": served / total if total else 0.0,
+            "l1_entries": len(self.local) if self.local is not None else 0,
+        }
+
+    def _should_refresh_early(self, entry: Dict[str, Any], now: float) -> bool:
+        # Вероятностное досрочное обновление (XFetch): чем ближе срок и дольше загрузка,
+        # тем выше шанс, что именно этот запрос обновит значение
+        return now - entry["delta"] * self.beta * math.log(1.0 - random.random()) >= entry["expires"]
+
+    async def _single_flight(self, key: str, loader: Loader, ttl: int) -> Any:
+        # Внутри процесса на один ключ выполняется только одна загрузка
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load_with_lock(key, loader, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано текущему вызывающему, ожидающие получат его из future
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _load_with_lock(self, key: str, loader: Loader, ttl: int) -> Any:
+        # Между репликами загрузку выполняет владелец блокировки, остальные ждут значения
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        try:
+            with tracer.span("redis.lock", key=lock_key):
+                acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except RedisError as e:
+            self.stats["errors"] += 1
+            logger.error("Не удалось взять блокировку %s: %s", lock_key, e)
+            return await loader()
+
+        if acquired:
+            try:
+                return await self._load_and_store(key, loader, ttl)
+            finally:
+                await self._unlock(lock_key, token)
+
+        self.stats["lock_waits"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_timeout
+        with tracer.span("cache.lock_wait", key=key):
+            while loop.time() < deadline:
+                await asyncio.sleep(self.lock_poll_interval)
+                raw = await self.redis.get(key)
+                entry = serialization.loads(raw) if raw is not None else None
+                if isinstance(entry, dict) and "expires" in entry:
+                    return entry["value"]
+
+        # Владелец блокировки не успел (или упал) — загружаем сами
+        logger.warning("Истекло ожидание блокировки %s, загружаем данные самостоятельно.", lock_key)
+        return await self._load_and_store(key, loader, ttl)
+
+    async def _load_and_store(self, key: str, loader: Loader, ttl: int) -> Any:
+        start = time.monotonic()
+        value = await loader()
+        delta = time.monotonic() - start
+
+        entry = {"value": value, "delta": delta, "expires": time.time() + ttl}
+        try:
+            with tracer.span("redis.set", key=key):
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(key, serialization.dumps(entry), ex=ttl + self.stale_ttl)
+                if self.local is not None:
+                    # Остальные реплики удаляют устаревшую копию из своего L1
+                    pipe.publish(INVALIDATION_CHANNEL, f"{self.local.origin}:{key}")
+                await pipe.execute()
+        except RedisError as e:
+            self.stats["errors"] += 1
+            logger.error("Не удалось сохранить %s в кэше: %s", key, e)
+        if self.local is not None:
+            self.local.set(key, value, ttl)
+        return value
+
+    def _refresh_in_background(self, key: str, loader: Loader, ttl: int):
+        if key in self._refreshing or key in self._inflight:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, loader, ttl))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refresh(self, key: str, loader: Loader, ttl: int):
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        try:
+            # Если блокировка занята, значение уже обновляет другая реплика
+            if not await self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                return
+            try:
+                await self._load_and_store(key, loader, ttl)
+                self.stats["refreshes"] += 1
+            finally:
+                await self._unlock(lock_key, token)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error("Ошибка фонового обновления кэша %s: %s", key, e)
+        finally:
+            self._refreshing.discard(key)
+
+    async def _unlock(self, lock_key: str, token: str):
+        try:
+            await self._release_lock(keys=[lock_key], args=[token])
+        except RedisError as e:
+            logger.error("Не удалось снять блокировку %s: %s", lock_key, e)
@@ -0,0 +1,136 @@
+# game_state.py
+from typing import Dict, List, Optional, Sequence, Union
+
+CELLS = 81
+MAX_SEATS = 255  # Номер места хранится в одном байте (0 — клетка без владельца)
+
+WireCell = Union[int, Dict[str, Union[int, str]]]
+
+
+class Board:
+    """
+    Доска лобби: значения 81 клетки подряд в bytearray (0 — пустая клетка) и владельцы
+    в параллельном bytearray. Владелец — номер места игрока в seats плюс один; 0 у
+    исходных и пустых клеток. Место закрепляется за игроком при первом ходе и не
+    освобождается, поэтому клетки ушедшего игрока сохраняют владельца.
+    """
+
+    __slots__ = ("values", "owners", "seats")
+
+    def __init__(self, values: bytearray, owners: Optional[bytearray] = None, seats: Optional[List[str]] = None):
+        self.values = values
+        self.owners = owners if owners is not None else bytearray(CELLS)
+        self.seats = seats if seats is not None else []
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[WireCell]]) -> "Board":
+        """
+        Доска из вложенных списков: исходной доски из чисел или доски в формате
+        клиента и журнала, где заполненные игроками клетки — {"value", "owner"}.
+        """
+        board = cls(bytearray(CELLS))
+        index = 0
+        for row in rows:
+            for cell in row:
+                if isinstance(cell, dict):
+                    board.values[index] = cell["value"]
+                    if cell.get("owner") is not None:
+                        board.owners[index] = board.seat(cell["owner"])
+                else:
+                    board.values[index] = cell
+                index += 1
+        return board
+
+    def seat(self, player: str) -> int:
+        try:
+            return self.seats.index(player) + 1
+        except ValueError:
+            if len(self.seats) >= MAX_SEATS:
+                raise ValueError("Too many players on one board")
+            self.seats.append(player)
+            return len(self.seats)
+
+    def value(self, row: int, col: int) -> int:
+        return self.values[row * 9 + col]
+
+    def owner(self, row: int, col: int) -> Optional[str]:
+        seat = self.owners[row * 9 + col]
+        return self.seats[seat - 1] if seat else None
+
+    def place(self, row: int, col: int, value: int, player: str):
+        index = row * 9 + col
+        self.values[index] = value
+        self.owners[index] = self.seat(player)
+
+    def clear(self, row: int, col: int):
+        index = row * 9 + col
+        self.values[index] = 0
+        self.owners[index] = 0
+
+    def is_full(self) -> bool:
+        return 0 not in self.values
+
+    def to_wire(self) -> List[List[WireCell]]:
+        """
+        Доска для клиента за один проход: числа для исходных и пустых клеток,
+        {"value", "owner"} для заполненных игроками.
+        """
+        values, owners, seats = self.values, self.owners, self.seats
+        cells: List[WireCell] = list(values)
+        if any(owners):
+            for index, seat in enumerate(owners):
+                if seat:
+                    cells[index] = {"value": values[index], "owner": seats[seat - 1]}
+        return [cells[start:start + 9] for start in range(0, CELLS, 9)]
+
+
+class LobbyPlayer:
+    __slots__ = ("player_id", "name", "color")
+
+    def __init__(self, player_id: str, name: str, color: str):
+        self.player_id = player_id
+        self.name = name
+        self.color = color
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"player_id": self.player_id, "name": self.name, "color": self.color}
+
+
+class Lobby:
+    """
+    Состояние лобби в памяти реплики.
+
+    reserved — имена игроков, за которыми закреплены места (лобби из очереди подбора);
+    handoff — {"players", "until"}: места игроков, переподключающихся после остановки
+    другой реплики; seq — номер последнего события журнала. solution — решение исходной
+    доски (81 байт), вычисляется при первой подсказке; hints — сколько подсказок взял
+    каждый игрок (None, пока подсказок не было).
+    """
+
+    __slots__ = (
+        "game_id", "players", "board", "scores", "finished", "reserved", "db_id", "seq", "handoff", "solution", "hints",
+    )
+
+    def __init__(
+        self,
+        game_id: str,
+        board: Board,
+        scores: Optional[Dict[str, int]] = None,
+        finished: bool = False,
+        reserved: Optional[List[str]] = None,
+        db_id: Optional[int] = None,
+        seq: int = 0,
+        handoff: Optional[Dict] = None,
+        hints: Optional[Dict[str, int]] = None,
+    ):
+        self.game_id = game_id
+        self.players: List[LobbyPlayer] = []
+        self.board = board
+        self.scores = scores if scores is not None else {}
+        self.finished = finished
+        self.reserved = reserved
+        self.db_id = db_id
+        self.seq = seq
+        self.handoff = handoff
+        self.solution: Optional[bytes] = None
+        self.hints = hints
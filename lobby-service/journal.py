@@ -0,0 +1,302 @@
+# journal.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from game_state import Lobby
+from metrics import JOURNAL_FLUSH
+from serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_KEY = "journal:lobbies"
+# В stream все значения — строки; эти поля при чтении приводятся обратно к int
+INT_FIELDS = ("seq", "row", "col", "value", "dbId")
+
+
+def stream_key(lobby_id: str) -> str:
+    return f"lobby:{lobby_id}:journal"
+
+
+def snapshot_key(lobby_id: str) -> str:
+    return f"lobby:{lobby_id}:snapshot"
+
+
+def encode_board(board: List[List[int]]) -> str:
+    """
+    Исходная доска в виде строки из 81 цифры (0 — пустая клетка).
+    """
+    return "".join(str(cell) for row in board for cell in row)
+
+
+def decode_board(data: str) -> List[List[int]]:
+    return [[int(data[r * 9 + c]) for c in range(9)] for r in range(9)]
+
+
+def apply_event(state: Dict, event: Dict):
+    """
+    Применяет событие журнала к состоянию лобби (board, scores, finished, hints).
+    Повторяет изменения, которые делает lobby_session, поэтому доска после
+    воспроизведения совпадает с доской в памяти.
+    """
+    kind = event["type"]
+    player = event.get("player")
+    if kind == "create":
+        state["board"] = decode_board(event["board"])
+        state["scores"] = {}
+        state["finished"] = False
+    elif kind == "join":
+        state["scores"].setdefault(player, 0)
+    elif kind == "leave":
+        state["scores"].pop(player, None)
+    elif kind == "move":
+        state["board"][event["row"]][event["col"]] = {"value": event["value"], "owner": player}
+        state["scores"][player] = state["scores"].get(player, 0) + 1
+    elif kind == "erase":
+        state["board"][event["row"]][event["col"]] = 0
+        state["scores"][player] = state["scores"].get(player, 0) - 1
+    elif kind == "hint":
+        # Сама подсказка не журналируется — только то, что игрок её потратил
+        hints = state.get("hints") or {}
+        hints[player] = hints.get(player, 0) + 1
+        state["hints"] = hints
+    elif kind == "finish":
+        state["finished"] = True
+        state["winner"] = player
+    elif kind == "handoff" and "players" in event:
+        # Реплика передала лобби другой: места игроков удерживаются до until. В game_moves
+        # этих полей нет — на доску и счёт handoff не влияет, и при повторе из архива он пропускается
+        state["handoff"] = {"players": loads(event["players"]), "until": float(event["until"])}
+
+
+def decode_entry(fields: Dict[str, str]) -> Dict[str, Any]:
+    event: Dict[str, Any] = dict(fields)
+    for name in INT_FIELDS:
+        if name in event:
+            event[name] = int(event[name])
+    event["ts"] = float(event["ts"])
+    return event
+
+
+class MoveJournal:
+    """
+    Журнал событий лобби только на добавление: create, join, leave, move, erase, hint, finish
+    и handoff с порядковым номером внутри лобби. Каждое лобби пишет в свой Redis stream, где ID
+    записи равен номеру события, так что хвост после снимка читается одним XRANGE.
+
+    Запись не ждёт Redis: append() кладёт событие в буфер, а фоновая задача раз в
+    flush_interval отправляет всё накопленное одним pipeline. Каждые snapshot_every
+    событий в тот же pipeline добавляется снимок доски и счёта, чтобы восстановление
+    не проигрывало журнал с начала. При сбое теряется не больше flush_interval событий.
+
+    Когда лобби удаляется, журнал целиком передаётся в archive (таблица game_moves) и
+    ключи Redis удаляются. Ходы хранятся без доски, доска любого момента партии
+    восстанавливается проигрыванием событий от исходной доски.
+    """
+
+    def __init__(
+        self,
+        archive: Callable[[int, List[Dict[str, Any]]], Awaitable[None]],
+        flush_interval: float = 0.05,
+        snapshot_every: int = 20,
+        max_buffer: int = 10000,
+    ):
+        self.archive = archive
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.max_buffer = max_buffer
+        self.redis = None
+        # Записи идут строго по очереди: иначе XADD следующей пачки может опередить
+        # предыдущую, и та будет отвергнута Redis. Создаётся в start(), внутри event loop
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # ("event" | "snapshot", lobby_id, seq, данные)
+        self._buffer: List[Tuple[str, str, int, Dict[str, Any]]] = []
+        # Удалённые лобби: (lobby_id, id игры в базе), архивируются после записи их событий
+        self._closed: List[Tuple[str, int]] = []
+        self.dropped = 0
+
+    def start(self, redis_client) -> asyncio.Task:
+        """
+        Запускает фоновую запись журнала (вызывается в lifespan).
+        """
+        self.redis = redis_client
+        self._flush_lock = asyncio.Lock()
+        return asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Дописываем то, что накопилось к моменту остановки
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Не удалось дописать журнал лобби при остановке: %s", e)
+
+    def append(self, lobby_id: str, lobby: Lobby, kind: str, **fields: Any) -> int:
+        """
+        Добавляет событие в журнал лобби и возвращает его номер.
+        """
+        seq = lobby.seq + 1
+        lobby.seq = seq
+        entry = {"seq": seq, "type": kind, "ts": time.time()}
+        entry.update((name, value) for name, value in fields.items() if value is not None)
+        self._push(("event", lobby_id, seq, entry))
+        if seq % self.snapshot_every == 0:
+            self._push(("snapshot", lobby_id, seq, self.snapshot(lobby)))
+        return seq
+
+    def snapshot(self, lobby: Lobby) -> Dict[str, Any]:
+        # Доска сериализуется сразу: к моменту записи лобби уже изменится
+        return {
+            "seq": lobby.seq,
+            "gameId": lobby.game_id,
+            "dbId": lobby.db_id,
+            "board": dumps_str(lobby.board.to_wire()),
+            "scores": dict(lobby.scores),
+            "finished": lobby.finished,
+            "reserved": lobby.reserved,
+            "handoff": lobby.handoff,
+            "hints": dict(lobby.hints) if lobby.hints else None,
+        }
+
+    def persist(self, lobby_id: str, lobby: Lobby):
+        """
+        Внеочередной снимок лобби, например перед передачей другой реплике.
+        """
+        self._push(("snapshot", lobby_id, lobby.seq, self.snapshot(lobby)))
+
+    def close(self, lobby_id: str, db_id: int):
+        """
+        Лобби удалено: после записи оставшихся событий журнал уходит в архив.
+        """
+        self._closed.append((lobby_id, db_id))
+
+    def _push(self, item: Tuple[str, str, int, Dict[str, Any]]):
+        if len(self._buffer) >= self.max_buffer:
+            # Redis недоступен дольше, чем помещается в буфер: старые события теряются
+            self._buffer.pop(0)
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.error("Буфер журнала лобби переполнен, потеряно событий: %s", self.dropped)
+        self._buffer.append(item)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка записи журнала лобби: %s", e)
+
+    async def flush(self):
+        """
+        Записывает накопленные события и архивирует удалённые лобби. Вызовы из фоновой
+        задачи, drain() и stop() выполняются по одному.
+        """
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            start = time.perf_counter()
+            pipe = self.redis.pipeline(transaction=False)
+            for kind, lobby_id, seq, data in batch:
+                if kind == "event":
+                    if data["type"] == "create":
+                        pipe.sadd(ACTIVE_KEY, lobby_id)
+                    pipe.xadd(stream_key(lobby_id), {name: str(value) for name, value in data.items()}, id=f"{seq}-0")
+                else:
+                    pipe.set(snapshot_key(lobby_id), dumps_str(data))
+            try:
+                results = await pipe.execute(raise_on_error=False)
+            except BaseException:
+                # Соединение потеряно или задача отменена: пачка вернётся в буфер и уйдёт со следующей
+                self._buffer[:0] = batch
+                raise
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                logger.error("Журнал лобби: %s команд из %s не выполнено: %s", len(errors), len(results), errors[0])
+            JOURNAL_FLUSH.observe(time.perf_counter() - start)
+
+        while self._closed:
+            lobby_id, db_id = self._closed[0]
+            events = await self.read(lobby_id)
+            if events:
+                await self.archive(db_id, events)
+            await self.redis.delete(stream_key(lobby_id), snapshot_key(lobby_id))
+            await self.redis.srem(ACTIVE_KEY, lobby_id)
+            self._closed.pop(0)
+            logger.info("Журнал лобби %s перенесён в архив игры %s: %s событий", lobby_id, db_id, len(events))
+
+    async def read(self, lobby_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """
+        События лобби с номером больше after (уже записанные в Redis).
+        """
+        entries = await self.redis.xrange(stream_key(lobby_id), min=f"{after + 1}-0", max="+")
+        return [decode_entry(fields) for _, fields in entries]
+
+    async def last_seq(self, lobby_id: str) -> int:
+        """
+        Номер последнего записанного в Redis события лобби (0, если журнала нет).
+        """
+        entries = await self.redis.xrevrange(stream_key(lobby_id), count=1)
+        return int(entries[0][0].split("-")[0]) if entries else 0
+
+    async def recover(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Восстанавливает незавершённые лобби после перезапуска: последний снимок плюс
+        события после него. Игроки не восстанавливаются — они переподключаются сами.
+        """
+        recovered: Dict[str, Dict[str, Any]] = {}
+        for lobby_id in await self.redis.smembers(ACTIVE_KEY):
+            try:
+                state = await self.restore(lobby_id)
+            except Exception as e:
+                logger.error("Не удалось восстановить лобби %s из журнала: %s", lobby_id, e)
+                continue
+            if state is None:
+                await self.redis.srem(ACTIVE_KEY, lobby_id)
+                continue
+            recovered[lobby_id] = state
+        if recovered:
+            logger.info("Из журнала восстановлено лобби: %s", len(recovered))
+        return recovered
+
+    async def restore(self, lobby_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние лобби по снимку и журналу или None, если журнала нет.
+        """
+        raw = await self.redis.get(snapshot_key(lobby_id))
+        if raw is not None:
+            snapshot = loads(raw)
+            state = {
+                "gameId": snapshot["gameId"],
+                "dbId": snapshot["dbId"],
+                "board": loads(snapshot["board"]),
+                "scores": snapshot["scores"],
+                "finished": snapshot["finished"],
+                "reserved": snapshot["reserved"],
+                "handoff": snapshot.get("handoff"),
+                "hints": snapshot.get("hints"),
+                "seq": snapshot["seq"],
+            }
+            events = await self.read(lobby_id, after=snapshot["seq"])
+        else:
+            events = await self.read(lobby_id)
+            if not events or events[0]["type"] != "create":
+                return None
+            create = events[0]
+            state = {
+                "gameId": create["gameId"],
+                "dbId": create["dbId"],
+                "reserved": loads(create["reserved"]) if create.get("reserved") else None,
+                "handoff": None,
+                "hints": None,
+                "seq": 0,
+            }
+        for event in events:
+            apply_event(state, event)
+            state["seq"] = event["seq"]
+        return state
@@ -0,0 +1,85 @@
+# leaderboard.py
+import logging
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Метрика рейтинга -> столбец таблицы user_stats
+METRICS = {"wins": "wins", "score": "total_score"}
+REBUILD_CHUNK = 1000
+
+
+def leaderboard_key(metric: str) -> str:
+    return f"leaderboard:{metric}"
+
+
+def user_stats(row: Mapping[str, Any], rank: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Ответ со статистикой игрока по строке user_stats.
+    """
+    games_played = row["games_played"]
+    return {
+        "username": row["username"],
+        "games_played": games_played,
+        "wins": row["wins"],
+        "win_rate": round(row["wins"] / games_played, 4) if games_played else 0.0,
+        "average_score": round(row["total_score"] / games_played, 2) if games_played else 0.0,
+        "rank": rank,
+    }
+
+
+class Leaderboard:
+    """
+    Рейтинги игроков в sorted set Redis (по одному на метрику), поэтому первые N мест и
+    место игрока читаются за O(log n) без агрегации по games и game_players.
+
+    Источник истины — таблица user_stats, которая обновляется при завершении игры;
+    в sorted set записываются уже итоговые значения из неё, а не приращения, так что
+    повторная запись безопасна. Если ключей нет (новый Redis или сбой), рейтинг
+    пересобирается из таблицы.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+
+    async def update(self, rows: Iterable[Mapping[str, Any]]):
+        pipe = self.redis.pipeline(transaction=False)
+        for metric, column in METRICS.items():
+            mapping = {row["username"]: row[column] for row in rows}
+            if mapping:
+                pipe.zadd(leaderboard_key(metric), mapping)
+        await pipe.execute()
+
+    async def exists(self) -> bool:
+        return bool(await self.redis.exists(*(leaderboard_key(metric) for metric in METRICS)))
+
+    async def rebuild(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """
+        Пересобирает рейтинги во временных ключах и атомарно подменяет ими текущие.
+        """
+        rows = list(rows)
+        pipe = self.redis.pipeline(transaction=False)
+        for metric, column in METRICS.items():
+            temporary = f"{leaderboard_key(metric)}:rebuild"
+            pipe.delete(temporary)
+            for start in range(0, len(rows), REBUILD_CHUNK):
+                chunk = rows[start:start + REBUILD_CHUNK]
+                pipe.zadd(temporary, {row["username"]: row[column] for row in chunk})
+            if rows:
+                pipe.rename(temporary, leaderboard_key(metric))
+            else:
+                pipe.delete(leaderboard_key(metric))
+        await pipe.execute()
+        logger.info("Рейтинг игроков пересобран: %s игроков", len(rows))
+        return len(rows)
+
+    async def top(self, metric: str, offset: int, limit: int) -> List[Tuple[str, int]]:
+        entries = await self.redis.zrevrange(leaderboard_key(metric), offset, offset + limit - 1, withscores=True)
+        return [(username, int(score)) for username, score in entries]
+
+    async def rank(self, metric: str, username: str) -> Optional[int]:
+        """
+        Место игрока (с 1) или None, если он ещё не завершил ни одной игры.
+        """
+        position = await self.redis.zrevrank(leaderboard_key(metric), username)
+        return position + 1 if position is not None else None
@@ -0,0 +1,190 @@
+# lifecycle.py
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from prometheus_client.core import GaugeMetricFamily
+
+from metrics import LOBBY_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+# created — в лобби ещё никто не вошёл (или все вышли из восстановленного), waiting — один
+# игрок, playing — двое, finished — партия завершена. archived — лобби уже нет в памяти:
+# журнал перенесён в game_moves. Лобби, вытесненные при превышении лимита, остаются в
+# Redis (offloaded) и возвращаются в память при подключении игрока.
+STATES = ("created", "waiting", "playing", "finished")
+SIZE_SAMPLE = 64  # Сколько лобби измеряется для оценки занятой памяти
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Приблизительный размер объекта вместе со всем, на что он ссылается.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(deep_size(getattr(obj, name, None), seen) for name in type(obj).__slots__)
+    elif hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+class LobbyLifecycle:
+    """
+    Время последней активности лобби и фоновая очистка памяти.
+
+    Лобби хранятся в OrderedDict в порядке последней активности (touch), так что
+    самые давно неактивные всегда в начале. Раз в reap_interval секунд очистка
+    проходит от начала, пока простой не станет меньше наименьшего TTL, и передаёт
+    в evict лобби, простоявшие дольше TTL своего состояния. Если лобби в памяти больше
+    max_resident, вытесняются давно неактивные лобби без подключённых игроков (offload).
+
+    state_of(lobby_id) возвращает состояние лобби или None, если лобби сейчас трогать
+    нельзя (например, места удерживаются для игроков с другой реплики). evict и offload
+    возвращают, что стало с лобби ("archived", "offloaded", "dropped"), или None, если
+    лобби оставлено в памяти (например, в нём есть игроки и вытеснить его нельзя).
+    """
+
+    def __init__(
+        self,
+        state_of: Callable[[str], Optional[str]],
+        evict: Callable[[str, str], Awaitable[Optional[str]]],
+        offload: Callable[[str], Optional[str]],
+        archive_offloaded: Callable[[str, int, int], Awaitable[str]],
+        sizes: Callable[[Iterable[str]], int],
+        ttls: Dict[str, float],
+        max_resident: int = 10000,
+        reap_interval: float = 10.0,
+    ):
+        self.state_of = state_of
+        self.evict = evict
+        self.offload = offload
+        self.archive_offloaded = archive_offloaded
+        self.sizes = sizes
+        # TTL 0 — лобби в этом состоянии по простою не удаляются
+        self.ttls = {state: ttl for state, ttl in ttls.items() if ttl > 0}
+        self.max_resident = max_resident
+        self.reap_interval = reap_interval
+        self.last_active: "OrderedDict[str, float]" = OrderedDict()
+        # Вытесненные в Redis лобби: lobby_id -> (id игры в базе, номер последнего события, время вытеснения)
+        self.offloaded: Dict[str, Tuple[int, int, float]] = {}
+
+    def touch(self, lobby_id: str):
+        self.last_active[lobby_id] = time.monotonic()
+        self.last_active.move_to_end(lobby_id)
+        self.offloaded.pop(lobby_id, None)
+
+    def forget(self, lobby_id: str):
+        self.last_active.pop(lobby_id, None)
+
+    def mark_offloaded(self, lobby_id: str, db_id: int, seq: int):
+        self.offloaded[lobby_id] = (db_id, seq, time.monotonic())
+
+    def start(self) -> asyncio.Task:
+        return asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка очистки лобби: %s", e)
+
+    async def reap(self):
+        now = time.monotonic()
+        expired = []
+        if self.ttls:
+            shortest = min(self.ttls.values())
+            for lobby_id, last_active in self.last_active.items():
+                idle = now - last_active
+                if idle < shortest:
+                    break
+                state = self.state_of(lobby_id)
+                ttl = self.ttls.get(state) if state is not None else None
+                if ttl is not None and idle >= ttl:
+                    expired.append((lobby_id, state))
+        for lobby_id, state in expired:
+            if lobby_id in self.last_active:
+                action = await self.evict(lobby_id, state)
+                if action is not None:
+                    LOBBY_EVICTIONS.labels(state, action).inc()
+
+        # Вытесненные лобби, к которым так и не вернулись, архивируются по TTL created
+        ttl = self.ttls.get("created")
+        if ttl is not None:
+            for lobby_id, (db_id, seq, since) in list(self.offloaded.items()):
+                if now - since >= ttl and self.offloaded.pop(lobby_id, None) is not None:
+                    LOBBY_EVICTIONS.labels("offloaded", await self.archive_offloaded(lobby_id, db_id, seq)).inc()
+
+        self.enforce_limit()
+        if expired:
+            logger.info("Удалено неактивных лобби: %s, в памяти: %s", len(expired), len(self.last_active))
+
+    def enforce_limit(self, reserve: int = 0) -> bool:
+        """
+        Вытесняет давно неактивные лобби без игроков, пока в памяти не останется места
+        ещё для reserve лобби. False — места нет: все лобби заняты игроками.
+        """
+        excess = len(self.last_active) + reserve - self.max_resident
+        if excess <= 0:
+            return True
+        for lobby_id in list(self.last_active):
+            if excess <= 0:
+                break
+            state = self.state_of(lobby_id)
+            if state is None:
+                continue
+            action = self.offload(lobby_id)
+            if action is not None:
+                LOBBY_EVICTIONS.labels(state, action).inc()
+                excess -= 1
+        if excess > 0:
+            logger.warning("В памяти %s лобби при лимите %s, вытеснить нечего", len(self.last_active), self.max_resident)
+        return excess <= 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Число лобби в памяти по состояниям и оценка занятой ими памяти
+        (средний размер по выборке из SIZE_SAMPLE лобби, умноженный на их число).
+        """
+        counts = dict.fromkeys(STATES, 0)
+        for lobby_id in self.last_active:
+            state = self.state_of(lobby_id) or "created"
+            counts[state] += 1
+        resident = len(self.last_active)
+        sample = random.sample(list(self.last_active), min(SIZE_SAMPLE, resident))
+        estimated_bytes = self.sizes(sample) * resident // len(sample) if sample else 0
+        return {
+            "resident": resident,
+            "maxResident": self.max_resident,
+            "states": counts,
+            "offloaded": len(self.offloaded),
+            "estimatedBytes": estimated_bytes,
+        }
+
+    def collect(self):
+        stats = self.stats()
+        resident = GaugeMetricFamily("lobby_resident", "Лобби в памяти реплики", labels=["state"])
+        for state, count in stats["states"].items():
+            resident.add_metric([state], count)
+        yield resident
+        yield GaugeMetricFamily("lobby_offloaded", "Лобби, вытесненные в Redis", value=stats["offloaded"])
+        yield GaugeMetricFamily(
+            "lobby_resident_bytes", "Оценка памяти, занятой лобби в памяти реплики", value=stats["estimatedBytes"]
+        )
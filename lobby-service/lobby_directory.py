@@ -0,0 +1,242 @@
+# lobby_directory.py
+import asyncio
+import bisect
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from game_state import Lobby
+from protocol import Codec, send_frame
+
+logger = logging.getLogger(__name__)
+
+MAX_PLAYERS = 2
+SEND_TIMEOUT_SECONDS = 5
+STATUSES = ("waiting", "full", "finished")
+
+
+def lobby_status(lobby: Lobby) -> str:
+    if lobby.finished:
+        return "finished"
+    if len(lobby.players) >= MAX_PLAYERS:
+        return "full"
+    return "waiting"
+
+
+def summarize(lobby_id: str, lobby: Lobby) -> Dict[str, Any]:
+    """
+    Лёгкая сводка лобби для списка: без доски и счёта.
+    """
+    players = [player.name for player in lobby.players]
+    return {
+        "lobbyId": lobby_id,
+        "gameId": lobby.game_id,
+        "players": players,
+        "playerCount": len(players),
+        "maxPlayers": MAX_PLAYERS,
+        "status": lobby_status(lobby),
+        "reserved": bool(lobby.reserved),
+    }
+
+
+def index_keys(summary: Dict[str, Any]) -> Tuple[Tuple, ...]:
+    """
+    Ключи вторичных индексов, в которые входит лобби.
+    """
+    status, game_id = summary["status"], summary["gameId"]
+    return (("all",), ("status", status), ("game", game_id), ("game_status", game_id, status))
+
+
+class Subscriber:
+    def __init__(self, websocket: WebSocket, codec: Codec, queue_size: int):
+        self.websocket = websocket
+        self.codec = codec
+        # Закодированные кадры; None — сигнал закрыть соединение
+        self.queue: "asyncio.Queue[Optional[Union[str, bytes]]]" = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
+class LobbyDirectory:
+    """
+    Каталог лобби: хранит сводки и рассылает подписчикам /ws/lobbies начальный список
+    и дальнейшие изменения (lobby_created, lobby_updated, lobby_finished, lobby_removed).
+    Все события проходят через одну очередь, поэтому новый подписчик никогда не получит
+    событие раньше начального списка.
+
+    Фоновая задача кодирует событие один раз для каждого протокола и кладёт кадр в
+    ограниченную очередь каждого подписчика; отправкой занимается отдельная задача
+    подписчика, так что медленный клиент не задерживает остальных. Подписчик, чья очередь
+    переполнилась, отключается: переподключившись, он получит актуальный список.
+
+    Для выборок поддерживаются вторичные индексы по статусу, gameId и их сочетанию.
+    Каждое лобби получает возрастающий порядковый номер; индекс — отсортированный список
+    номеров, поэтому страница из k лобби после курсора выбирается за O(log n + k).
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = max(2, queue_size)
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self._next_seq = 1
+        self._seq_by_id: Dict[str, int] = {}
+        self._id_by_seq: Dict[int, str] = {}
+        self._indexes: Dict[Tuple, List[int]] = {}
+        self.subscribers: Dict[WebSocket, Subscriber] = {}
+        # (адресат, сообщение): адресат None — рассылка всем, сообщение None — начальный список.
+        # Очередь создаётся в start(), внутри работающего event loop
+        self._queue: "Optional[asyncio.Queue[Tuple[Optional[WebSocket], Optional[Dict]]]]" = None
+        self._pending: Dict[WebSocket, Codec] = {}
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return list(self.summaries.values())
+
+    def upsert(self, lobby_id: str, lobby: Lobby, event: str = "lobby_updated"):
+        summary = summarize(lobby_id, lobby)
+        previous = self.summaries.get(lobby_id)
+        self.summaries[lobby_id] = summary
+
+        seq = self._seq_by_id.get(lobby_id)
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seq_by_id[lobby_id] = seq
+            self._id_by_seq[seq] = lobby_id
+        old_keys = set(index_keys(previous)) if previous is not None else set()
+        new_keys = set(index_keys(summary))
+        for key in old_keys - new_keys:
+            self._index_remove(key, seq)
+        for key in new_keys - old_keys:
+            self._index_add(key, seq)
+
+        self._enqueue(None, {"type": event, "lobby": summary})
+
+    def remove(self, lobby_id: str):
+        summary = self.summaries.pop(lobby_id, None)
+        if summary is not None:
+            seq = self._seq_by_id.pop(lobby_id)
+            del self._id_by_seq[seq]
+            for key in index_keys(summary):
+                self._index_remove(key, seq)
+            self._enqueue(None, {"type": "lobby_removed", "lobbyId": lobby_id})
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        game_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List[str], Optional[int]]:
+        """
+        Возвращает идентификаторы лобби, подходящих под фильтры, и курсор следующей страницы
+        (None, если страница последняя).
+        """
+        if status is not None and game_id is not None:
+            key = ("game_status", game_id, status)
+        elif status is not None:
+            key = ("status", status)
+        elif game_id is not None:
+            key = ("game", game_id)
+        else:
+            key = ("all",)
+        index = self._indexes.get(key, [])
+
+        start = bisect.bisect_right(index, cursor) if cursor is not None else 0
+        end = len(index) if limit is None else min(len(index), start + limit)
+        page = [self._id_by_seq[seq] for seq in index[start:end]]
+        next_cursor = index[end - 1] if end < len(index) else None
+        return page, next_cursor
+
+    def _index_add(self, key: Tuple, seq: int):
+        index = self._indexes.setdefault(key, [])
+        if not index or index[-1] < seq:
+            index.append(seq)
+        else:
+            bisect.insort(index, seq)
+
+    def _index_remove(self, key: Tuple, seq: int):
+        index = self._indexes.get(key)
+        if not index:
+            return
+        position = bisect.bisect_left(index, seq)
+        if position < len(index) and index[position] == seq:
+            del index[position]
+        if not index:
+            del self._indexes[key]
+
+    def subscribe(self, websocket: WebSocket, codec: Codec):
+        self._pending[websocket] = codec
+        self._enqueue(websocket, None)
+
+    def unsubscribe(self, websocket: WebSocket):
+        self._pending.pop(websocket, None)
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is not None and subscriber.task is not None:
+            subscriber.task.cancel()
+
+    def start(self) -> asyncio.Task:
+        """
+        Запускает фоновую задачу рассылки (вызывается в lifespan).
+        """
+        self._queue = asyncio.Queue()
+        return asyncio.create_task(self._run())
+
+    def _enqueue(self, target: Optional[WebSocket], message: Optional[Dict]):
+        if self._queue is not None:
+            self._queue.put_nowait((target, message))
+
+    async def _run(self):
+        while True:
+            target, message = await self._queue.get()
+            try:
+                if target is None:
+                    self._fan_out(message)
+                elif target in self._pending:
+                    codec = self._pending.pop(target)
+                    subscriber = Subscriber(target, codec, self.queue_size)
+                    subscriber.queue.put_nowait(codec.encode({"type": "lobbies", "lobbies": self.snapshot()}))
+                    subscriber.task = asyncio.create_task(self._send_loop(subscriber))
+                    self.subscribers[target] = subscriber
+            except Exception as e:
+                logger.error("Ошибка рассылки каталога лобби: %s", e)
+            # Пачка событий (прогрев, остановка реплики) не должна переполнить очереди
+            # подписчиков раньше, чем их задачи успеют отправить хоть что-то
+            await asyncio.sleep(0)
+
+    def _fan_out(self, message: Dict):
+        # Сообщение кодируется один раз для каждого протокола
+        frames: Dict[Codec, Union[str, bytes]] = {}
+        for websocket, subscriber in list(self.subscribers.items()):
+            codec = subscriber.codec
+            frame = frames.get(codec)
+            if frame is None:
+                frame = frames[codec] = codec.encode(message)
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Подписчик не успевает: пропущенные события не досылаются, соединение закрывается
+                logger.warning("Подписчик каталога лобби отключён: очередь переполнена")
+                del self.subscribers[websocket]
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+
+    async def _send_loop(self, subscriber: Subscriber):
+        try:
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    await subscriber.websocket.close(code=1013)  # Try Again Later
+                    break
+                await asyncio.wait_for(
+                    send_frame(subscriber.websocket, subscriber.codec, frame), timeout=SEND_TIMEOUT_SECONDS
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Подписчик каталога лобби отключён: %s", e)
+            if self.subscribers.get(subscriber.websocket) is subscriber:
+                del self.subscribers[subscriber.websocket]
+            try:
+                await subscriber.websocket.close()
+            except Exception:
+                pass
@@ -0,0 +1,197 @@
+# logging_config.py
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from tracing import tracer
+
+# Атрибуты LogRecord, которые не относятся к полям, переданным через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+# Аргументы этих типов безопасно форматировать позже в потоке логирования:
+# они неизменяемы, и к моменту записи сообщение не поменяется
+_DEFERRABLE_ARGS = (str, int, float, bool, type(None))
+
+
+def parse_rates(value: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Разбирает "<логгер>=<сообщений в секунду>:<всплеск>,...",
+    например "main=20:100,uvicorn.access=50:200".
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        rate, _, burst = limit.partition(":")
+        rates[name.strip()] = (float(rate), int(burst or rate))
+    return rates
+
+
+def parse_ratios(value: str) -> Dict[str, float]:
+    """
+    Разбирает "<логгер>=<доля>,...", например "uvicorn.access=0.1".
+    """
+    ratios = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, ratio = item.partition("=")
+        ratios[name.strip()] = float(ratio)
+    return ratios
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись — одна строка JSON. К записи добавляются идентификаторы текущей
+    трассы и поля, переданные через extra=.
+    """
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "service": self.service,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.span_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry and key not in ("trace_id", "span_id"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class HotPathFilter(logging.Filter):
+    """
+    Выборка и ограничение частоты для записей ниже WARNING. Настройки задаются по
+    имени логгера и наследуются дочерними логгерами ("sqlalchemy" действует и на
+    "sqlalchemy.engine.Engine"). Предупреждения и ошибки проходят всегда.
+    Число отброшенных записей сообщается в поле suppressed следующей прошедшей.
+    """
+
+    def __init__(self, rates: Dict[str, Tuple[float, int]], ratios: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.ratios = ratios
+        self.suppressed: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._rules: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, name: str) -> Tuple[Optional[str], Optional[str]]:
+        rules = self._rules.get(name)
+        if rules is None:
+            rate_key = ratio_key = None
+            candidate = name
+            while candidate:
+                if rate_key is None and candidate in self.rates:
+                    rate_key = candidate
+                if ratio_key is None and candidate in self.ratios:
+                    ratio_key = candidate
+                candidate = candidate.rpartition(".")[0]
+            rules = self._rules[name] = (rate_key, ratio_key)
+        return rules
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate_key, ratio_key = self._lookup(record.name)
+        if ratio_key is not None and random.random() >= self.ratios[ratio_key]:
+            return False
+        if rate_key is None:
+            return True
+
+        rate, burst = self.rates[rate_key]
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(rate_key, (float(burst), now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens < 1:
+                self._buckets[rate_key] = (tokens, now)
+                self.suppressed[rate_key] = self.suppressed.get(rate_key, 0) + 1
+                return False
+            self._buckets[rate_key] = (tokens - 1, now)
+            suppressed = self.suppressed.pop(rate_key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь, не форматируя её: сообщение собирается и пишется
+    в потоке QueueListener, а не в event loop. Если среди аргументов есть
+    изменяемые объекты, сообщение фиксируется сразу, чтобы в лог попало
+    их состояние на момент вызова.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = tracer.current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        if record.args and not all(isinstance(arg, _DEFERRABLE_ARGS) for arg in (
+            record.args.values() if isinstance(record.args, dict) else record.args
+        )):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Логи не должны тормозить обработку запросов: при переполнении запись теряется
+            pass
+
+
+def setup_logging(service: str, default_rates: str = "", default_sampling: str = "") -> QueueListener:
+    """
+    Настраивает корневой логгер: фильтр горячих путей, неблокирующая очередь
+    и вывод в stdout из отдельного потока. Переменные окружения:
+      LOG_LEVEL        — уровень (по умолчанию INFO);
+      LOG_FORMAT       — json или text;
+      LOG_RATE_LIMITS  — ограничения частоты по логгерам, см. parse_rates;
+      LOG_SAMPLING     — доля записей, которые пишутся, по логгерам, см. parse_ratios;
+      LOG_QUEUE_SIZE   — размер очереди записей.
+    """
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    else:
+        formatter = JsonFormatter(service)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(HotPathFilter(
+        parse_rates(os.getenv("LOG_RATE_LIMITS", default_rates)),
+        parse_ratios(os.getenv("LOG_SAMPLING", default_sampling)),
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # uvicorn настраивает свои логгеры до импорта приложения; направляем их в общую очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,236 @@
+# matchmaking.py
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from board_generator import generate_sudoku_board
+
+logger = logging.getLogger(__name__)
+
+# Уровни сложности: доля пустых клеток, передаваемая в generate_sudoku_board
+DIFFICULTY_LEVELS: Dict[str, float] = {
+    "easy": 0.1,
+    "medium": 0.3,
+    "hard": 0.5,
+}
+
+# Создаёт лобби для пары игроков: (gameId, доска, имена игроков) -> lobbyId
+CreateLobby = Callable[[str, List[List[int]], List[str]], Awaitable[str]]
+
+
+class BoardPool:
+    """
+    Пул заранее сгенерированных досок для каждого уровня сложности.
+    Генерация идёт в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, size: int = 4):
+        self.size = size
+        self.boards: Dict[str, List[List[List[int]]]] = {level: [] for level in DIFFICULTY_LEVELS}
+        self._refilling: Dict[str, asyncio.Task] = {}
+
+    async def take(self, level: str) -> List[List[int]]:
+        boards = self.boards[level]
+        board = boards.pop() if boards else None
+        self.refill(level)
+        if board is None:
+            # Пул пуст: генерируем доску сразу, но тоже вне event loop
+            board = await asyncio.to_thread(generate_sudoku_board, DIFFICULTY_LEVELS[level])
+        return board
+
+    def refill(self, level: Optional[str] = None):
+        levels = [level] if level is not None else list(DIFFICULTY_LEVELS)
+        for name in levels:
+            task = self._refilling.get(name)
+            if len(self.boards[name]) < self.size and (task is None or task.done()):
+                self._refilling[name] = asyncio.create_task(self._refill(name))
+
+    async def _refill(self, level: str):
+        try:
+            while len(self.boards[level]) < self.size:
+                board = await asyncio.to_thread(generate_sudoku_board, DIFFICULTY_LEVELS[level])
+                self.boards[level].append(board)
+        except Exception as e:
+            logger.error("Ошибка генерации досок для пула %s: %s", level, e)
+
+    async def wait_filled(self):
+        """
+        Заполняет пул и ждёт окончания генерации (прогрев перед приёмом трафика).
+        """
+        self.refill()
+        await asyncio.gather(*self._refilling.values())
+
+    def stop(self):
+        for task in self._refilling.values():
+            task.cancel()
+
+
+class Matchmaker:
+    """
+    Очередь подбора соперников. Игроки встают в очередь по (gameId, сложность),
+    фоновая задача пачками объединяет их в пары, создаёт лобби с готовой доской
+    и резервирует в нём места за обоими игроками.
+    """
+
+    def __init__(
+        self,
+        create_lobby: CreateLobby,
+        batch_interval: float = 0.2,
+        queue_timeout: float = 120.0,
+        ticket_ttl: float = 60.0,
+        pool_size: int = 4,
+    ):
+        self.create_lobby = create_lobby
+        self.batch_interval = batch_interval
+        self.queue_timeout = queue_timeout  # Сколько тикет может ждать соперника
+        self.ticket_ttl = ticket_ttl  # Сколько хранится результат после подбора
+        self.pool = BoardPool(size=pool_size)
+        self.tickets: Dict[str, Dict[str, Any]] = {}
+        self.queues: Dict[Tuple[str, str], "OrderedDict[str, Dict[str, Any]]"] = {}
+        self._by_username: Dict[str, str] = {}  # username -> тикет в очереди
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> asyncio.Task:
+        """
+        Запускает пополнение пула досок и фоновый подбор пар (вызывается в lifespan).
+        """
+        self._wakeup = asyncio.Event()
+        self.pool.refill()
+        return asyncio.create_task(self._run())
+
+    def stop(self):
+        self.pool.stop()
+
+    def enqueue(self, username: str, game_id: str, level: str) -> Dict[str, Any]:
+        # Повторный запрос того же игрока возвращает уже существующий тикет
+        existing = self._by_username.get(username)
+        if existing is not None:
+            return self.tickets[existing]
+
+        ticket = {
+            "ticket": str(uuid.uuid4()),
+            "username": username,
+            "gameId": game_id,
+            "difficulty": level,
+            "status": "queued",
+            "lobbyId": None,
+            "opponent": None,
+            "created": time.monotonic(),
+            "updated": time.monotonic(),
+            "done": asyncio.get_running_loop().create_future(),
+        }
+        self.tickets[ticket["ticket"]] = ticket
+        self.queues.setdefault((game_id, level), OrderedDict())[ticket["ticket"]] = ticket
+        self._by_username[username] = ticket["ticket"]
+        logger.info("Пользователь %s встал в очередь подбора %s/%s", username, game_id, level)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return ticket
+
+    def get(self, ticket_id: str, username: str) -> Optional[Dict[str, Any]]:
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None or ticket["username"] != username:
+            return None
+        return ticket
+
+    def cancel(self, ticket: Dict[str, Any]) -> bool:
+        if ticket["status"] != "queued":
+            return False
+        self._dequeue(ticket)
+        self._finish(ticket, "cancelled")
+        logger.info("Пользователь %s покинул очередь подбора", ticket['username'])
+        return True
+
+    async def wait(self, ticket: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """
+        Ждёт подбора не дольше timeout секунд и возвращает тикет в текущем состоянии.
+        """
+        if ticket["status"] in ("queued", "matching") and timeout > 0:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket["done"]), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return ticket
+
+    @staticmethod
+    def public(ticket: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ticket": ticket["ticket"],
+            "status": ticket["status"],
+            "gameId": ticket["gameId"],
+            "difficulty": ticket["difficulty"],
+            "lobbyId": ticket["lobbyId"],
+            "opponent": ticket["opponent"],
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                # Без новых заявок просыпаемся раз в секунду, чтобы снимать просроченные тикеты
+                await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            # Небольшая пауза, чтобы набрать пачку заявок и обработать её за один проход
+            await asyncio.sleep(self.batch_interval)
+            self._wakeup.clear()
+            try:
+                await self._match_all()
+                self._expire()
+            except Exception as e:
+                logger.error("Ошибка подбора соперников: %s", e)
+
+    async def _match_all(self):
+        for (game_id, level), queue in list(self.queues.items()):
+            while len(queue) >= 2:
+                _, first = queue.popitem(last=False)
+                _, second = queue.popitem(last=False)
+                # Пока создаётся лобби, тикеты нельзя отменить
+                first["status"] = second["status"] = "matching"
+                try:
+                    board = await self.pool.take(level)
+                    lobby_id = await self.create_lobby(game_id, board, [first["username"], second["username"]])
+                except Exception as e:
+                    # Возвращаем пару в начало очереди и пробуем в следующем проходе
+                    logger.error("Не удалось создать лобби для %s и %s: %s", first['username'], second['username'], e)
+                    first["status"] = second["status"] = "queued"
+                    queue[second["ticket"]] = second
+                    queue[first["ticket"]] = first
+                    queue.move_to_end(second["ticket"], last=False)
+                    queue.move_to_end(first["ticket"], last=False)
+                    break
+                for ticket, opponent in ((first, second), (second, first)):
+                    ticket["lobbyId"] = lobby_id
+                    ticket["opponent"] = opponent["username"]
+                    self._finish(ticket, "matched")
+                logger.info("Подобрана пара %s и %s: лобби %s", first['username'], second['username'], lobby_id)
+            if not queue:
+                self.queues.pop((game_id, level), None)
+
+    def _expire(self):
+        now = time.monotonic()
+        for ticket in list(self.tickets.values()):
+            if ticket["status"] == "queued":
+                if now - ticket["created"] > self.queue_timeout:
+                    self._dequeue(ticket)
+                    self._finish(ticket, "expired")
+            elif now - ticket["updated"] > self.ticket_ttl:
+                del self.tickets[ticket["ticket"]]
+
+    def _dequeue(self, ticket: Dict[str, Any]):
+        key = (ticket["gameId"], ticket["difficulty"])
+        queue = self.queues.get(key)
+        if queue is not None:
+            queue.pop(ticket["ticket"], None)
+            if not queue:
+                del self.queues[key]
+
+    def _finish(self, ticket: Dict[str, Any], status: str):
+        ticket["status"] = status
+        ticket["updated"] = time.monotonic()
+        if self._by_username.get(ticket["username"]) == ticket["ticket"]:
+            del self._by_username[ticket["username"]]
+        if not ticket["done"].done():
+            ticket["done"].set_result(status)
@@ -0,0 +1,159 @@
+# metrics.py
+import time
+from collections import defaultdict
+from typing import Callable, Dict
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Бакеты для операций, которые длятся микросекунды (проверка хода, рассылка)
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "lobby_websocket_connections",
+    "Открытые WebSocket-соединения",
+    ["endpoint"],
+)
+MOVE_VALIDATION = Histogram(
+    "lobby_move_validation_seconds",
+    "Время проверки хода",
+    buckets=FAST_BUCKETS,
+)
+BROADCAST = Histogram(
+    "lobby_broadcast_seconds",
+    "Время рассылки сообщения всем соединениям лобби",
+    buckets=FAST_BUCKETS,
+)
+SPECTATOR_RESYNCS = Counter(
+    "lobby_spectator_resyncs",
+    "Зрители, отставшие от рассылки и получившие снимок вместо пропущенных событий",
+)
+JOURNAL_FLUSH = Histogram(
+    "lobby_journal_flush_seconds",
+    "Время записи пачки событий журнала лобби в Redis",
+    buckets=FAST_BUCKETS,
+)
+LOBBY_EVICTIONS = Counter(
+    "lobby_evictions",
+    "Лобби, удалённые из памяти реплики очисткой, по состоянию и результату (archived, offloaded, dropped)",
+    ["state", "action"],
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время получения соединения из пула базы данных",
+    buckets=FAST_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, измеряющее длительность HTTP-запросов.
+    Метка route — шаблон пути маршрута (например, /lobbies/{lobbyId}), а не сам путь,
+    чтобы число временных рядов не зависело от идентификаторов в URL.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - start)
+
+
+class LobbyMessageCounter:
+    """
+    Счётчики сообщений по лобби и типам. На горячем пути — только инкремент в словаре;
+    временные ряды Prometheus собираются при каждом опросе /metrics и только для
+    существующих лобби, поэтому завершённые лобби не копятся в памяти.
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def observe(self, lobby_id: str, message_type: str):
+        self.counts[lobby_id][message_type] += 1
+
+    def forget(self, lobby_id: str):
+        self.counts.pop(lobby_id, None)
+
+    def collect(self):
+        family = CounterMetricFamily(
+            "lobby_messages", "Сообщения, полученные от игроков лобби", labels=["lobby", "type"]
+        )
+        for lobby_id, by_type in list(self.counts.items()):
+            for message_type, count in list(by_type.items()):
+                family.add_metric([lobby_id, message_type], count)
+        yield family
+
+
+class StatsCollector:
+    """
+    Публикует счётчики из snapshot() объекта (например, RedisCache) как метрики.
+    Числа копятся в самом объекте, а здесь лишь читаются при опросе.
+    """
+
+    def __init__(self, prefix: str, description: str, snapshot: Callable[[], Dict[str, float]]):
+        self.prefix = prefix
+        self.description = description
+        self.snapshot = snapshot
+
+    def collect(self):
+        stats = self.snapshot()
+        events = CounterMetricFamily(
+            f"{self.prefix}_events", f"{self.description}: счётчики событий", labels=["event"]
+        )
+        for name, value in stats.items():
+            if name == "hit_ratio":
+                yield GaugeMetricFamily(f"{self.prefix}_hit_ratio", f"{self.description}: доля попаданий", value=value)
+            elif name == "l1_entries":
+                yield GaugeMetricFamily(f"{self.prefix}_l1_entries", f"{self.description}: записей в L1", value=value)
+            else:
+                events.add_metric([name], value)
+        yield events
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений SQLAlchemy, замеряющий ожидание свободного соединения.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+lobby_messages = LobbyMessageCounter()
+REGISTRY.register(lobby_messages)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
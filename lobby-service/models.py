@@ -0,0 +1,82 @@
+# models.py
+import sqlalchemy
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, ForeignKeyConstraint, MetaData
+from sqlalchemy.sql import func
+
+# Создаем метаданные
+metadata = MetaData()
+
+# Определение таблиц базы данных
+users_table = sqlalchemy.Table(
+    'users',
+    metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String, unique=True),
+    Column('created_at', DateTime, server_default=func.now()),
+)
+
+games_table = sqlalchemy.Table(
+    'games',
+    metadata,
+    Column('id', Integer, primary_key=True),
+    Column('lobby_id', String, unique=True),
+    Column('game_id', String),
+    Column('start_time', DateTime),
+    Column('end_time', DateTime, nullable=True),
+    Column('winner', String, nullable=True),
+)
+
+game_players_table = sqlalchemy.Table(
+    'game_players',
+    metadata,
+    Column('game_id', Integer, ForeignKey('games.id')),
+    Column('player_id', Integer, ForeignKey('users.id')),
+    sqlalchemy.PrimaryKeyConstraint('game_id', 'player_id'),
+)
+
+chat_messages_table = sqlalchemy.Table(
+    'chat_messages',
+    metadata,
+    Column('id', Integer, primary_key=True),
+    Column('game_id', Integer, nullable=False),
+    Column('lobby_id', String, nullable=True),  # Можно удалить, если не нужен
+    Column('sender', String),
+    Column('message', String),
+    Column('timestamp', DateTime, server_default=func.now()),
+    ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE')
+)
+
+# Архив журнала ходов: по нему воспроизводятся завершённые игры
+game_moves_table = sqlalchemy.Table(
+    'game_moves',
+    metadata,
+    Column('game_id', Integer, nullable=False),
+    Column('seq', Integer, nullable=False),
+    Column('type', String, nullable=False),  # create, join, leave, move, erase, hint, finish или handoff
+    Column('player', String, nullable=True),
+    Column('row', Integer, nullable=True),
+    Column('col', Integer, nullable=True),
+    Column('value', Integer, nullable=True),
+    Column('board', String, nullable=True),  # Исходная доска (81 цифра), только у события create
+    Column('created_at', DateTime),
+    sqlalchemy.PrimaryKeyConstraint('game_id', 'seq'),
+    ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE')
+)
+
+# Индексы для инкрементальной выгрузки в хранилище (warehouse-export): строки
+# выбираются по водяному знаку (время, id) без просмотра всей таблицы
+sqlalchemy.Index('ix_users_created_at_id', users_table.c.created_at, users_table.c.id)
+sqlalchemy.Index('ix_games_end_time_id', games_table.c.end_time, games_table.c.id)
+sqlalchemy.Index('ix_chat_messages_timestamp_id', chat_messages_table.c.timestamp, chat_messages_table.c.id)
+
+# Сводная статистика игроков; обновляется при завершении игры и служит источником
+# истины для рейтинга в Redis
+user_stats_table = sqlalchemy.Table(
+    'user_stats',
+    metadata,
+    Column('username', String, primary_key=True),
+    Column('games_played', Integer, nullable=False, default=0),
+    Column('wins', Integer, nullable=False, default=0),
+    Column('total_score', Integer, nullable=False, default=0),
+    Column('updated_at', DateTime),
+)
@@ -0,0 +1,117 @@
+# protocol.py
+from typing import Any, Dict, List, Union
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect
+
+import serialization
+
+# Подпротокол, который клиент может запросить через Sec-WebSocket-Protocol.
+# Без него соединение работает в JSON (как client/lobby.html).
+MSGPACK_SUBPROTOCOL = "sudoku.msgpack.v1"
+
+# Компактные сообщения клиента в бинарном протоколе — массивы фиксированной длины:
+#   [OP_MOVE, row, col, value]
+#   [OP_ERASE, row, col]
+#   [OP_CHAT, message]
+#   [OP_HINT]
+OP_MOVE = 1
+OP_ERASE = 2
+OP_CHAT = 3
+OP_HINT = 4
+
+Frame = Union[str, bytes]
+
+
+class ProtocolError(Exception):
+    """
+    Кадр не удалось разобрать в выбранном протоколе.
+    """
+
+
+class JsonCodec:
+    subprotocol = None
+    binary = False
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        return serialization.dumps_str(payload)
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        try:
+            data = serialization.loads(frame)
+        except (ValueError, TypeError):
+            raise ProtocolError("Invalid JSON format.")
+        if not isinstance(data, dict):
+            raise ProtocolError("Invalid JSON format.")
+        return data
+
+
+class MsgpackCodec:
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def encode(self, payload: Dict[str, Any]) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        try:
+            data = msgpack.unpackb(frame, raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException):
+            raise ProtocolError("Invalid MessagePack frame.")
+        if isinstance(data, list):
+            return decode_compact(data)
+        if isinstance(data, dict):
+            return data
+        raise ProtocolError("Invalid MessagePack frame.")
+
+
+def decode_compact(frame: List[Any]) -> Dict[str, Any]:
+    """
+    Разворачивает компактное сообщение фиксированной раскладки в словарь формата JSON-протокола.
+    """
+    if not frame:
+        raise ProtocolError("Empty frame.")
+    op = frame[0]
+    if op == OP_MOVE and len(frame) == 4 and all(type(x) is int for x in frame[1:]):
+        return {"type": "move", "row": frame[1], "col": frame[2], "value": frame[3]}
+    if op == OP_ERASE and len(frame) == 3 and all(type(x) is int for x in frame[1:]):
+        return {"type": "erase", "row": frame[1], "col": frame[2]}
+    if op == OP_CHAT and len(frame) == 2 and isinstance(frame[1], str):
+        return {"type": "chat", "message": frame[1]}
+    if op == OP_HINT and len(frame) == 1:
+        return {"type": "hint"}
+    raise ProtocolError("Invalid compact frame.")
+
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec()
+Codec = Union[JsonCodec, MsgpackCodec]
+
+
+def negotiate(websocket: WebSocket) -> Codec:
+    """
+    Выбирает кодек по подпротоколам, запрошенным клиентом при рукопожатии.
+    """
+    if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+async def receive_frame(websocket: WebSocket) -> Frame:
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message["text"]
+
+
+async def send_frame(websocket: WebSocket, codec: Codec, frame: Frame):
+    if codec.binary:
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+async def send_message(websocket: WebSocket, codec: Codec, payload: Dict[str, Any]):
+    await send_frame(websocket, codec, codec.encode(payload))
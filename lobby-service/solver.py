@@ -0,0 +1,364 @@
+# solver.py
+"""
+Решатель Sudoku 9x9: проверка единственности решения досок из пула и подсказки игрокам.
+
+Основной движок — битовые маски: для каждой строки, столбца и блока хранится маска
+занятых цифр, кандидаты клетки — дополнение объединения трёх масок. Поиск всегда
+раскрывает клетку с наименьшим числом кандидатов (клетки с одним кандидатом — то же,
+что распространение «голых одиночек»), а если таких нет — «скрытую одиночку»: цифру,
+которой в строке, столбце или блоке осталось одно место. Подсчёт решений
+останавливается на limit.
+
+Второй движок — алгоритм X Кнута для точного покрытия (324 ограничения, 729 вариантов).
+Вместо связных списков DLX столбцы хранятся множествами: снятие и возврат вариантов —
+те же операции cover/uncover. Он медленнее на Python и нужен для перекрёстной проверки.
+
+Запуск из каталога lobby-service (одна доска на строку: 81 символ, 0 или . — пустая клетка):
+    python solver.py puzzles.txt [--engine bitmask|dlx] [--workers 4]
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+CELLS = 81
+ALL_DIGITS = 0x1FF
+
+ROW_OF = [index // 9 for index in range(CELLS)]
+COL_OF = [index % 9 for index in range(CELLS)]
+BOX_OF = [(index // 27) * 3 + (index % 9) // 3 for index in range(CELLS)]
+POPCOUNT = [bin(mask).count("1") for mask in range(ALL_DIGITS + 1)]
+# Цифры маски кандидатов по возрастанию
+DIGITS = [[digit + 1 for digit in range(9) if mask >> digit & 1] for mask in range(ALL_DIGITS + 1)]
+
+Grid = Union[bytes, bytearray, str, Sequence[int], Sequence[Sequence[int]]]
+
+
+def flatten(board: Grid) -> List[int]:
+    """
+    81 значение подряд из доски 9x9, плоской последовательности или строки из цифр
+    (0 или . — пустая клетка).
+    """
+    if isinstance(board, str):
+        cells = [0 if char in "0." else int(char) for char in board.strip()]
+    elif len(board) == 9:
+        cells = [int(cell) for row in board for cell in row]
+    else:
+        cells = list(board)
+    if len(cells) != CELLS or any(not 0 <= cell <= 9 for cell in cells):
+        raise ValueError("A board must have 81 cells with values 0-9")
+    return cells
+
+
+class BitmaskSolver:
+    """
+    Поиск с возвратом по маскам строк, столбцов и блоков. Если у каждой незаполненной
+    клетки больше одного кандидата, сначала ставится скрытая одиночка, и только потом
+    перебираются кандидаты клетки, где их меньше всего.
+    """
+
+    def __init__(self, board: Grid):
+        self.values = flatten(board)
+        self.rows = [0] * 9
+        self.cols = [0] * 9
+        self.boxes = [0] * 9
+        self.empty: List[int] = []
+        self.consistent = True
+        for index, value in enumerate(self.values):
+            if value == 0:
+                self.empty.append(index)
+                continue
+            bit = 1 << (value - 1)
+            row, col, box = ROW_OF[index], COL_OF[index], BOX_OF[index]
+            if (self.rows[row] | self.cols[col] | self.boxes[box]) & bit:
+                # Исходные цифры уже противоречат друг другу
+                self.consistent = False
+            self.rows[row] |= bit
+            self.cols[col] |= bit
+            self.boxes[box] |= bit
+
+    def candidates(self, index: int) -> int:
+        return ~(self.rows[ROW_OF[index]] | self.cols[COL_OF[index]] | self.boxes[BOX_OF[index]]) & ALL_DIGITS
+
+    def solutions(self, limit: int = 1) -> List[List[int]]:
+        """
+        До limit решений; поиск прекращается, как только они найдены.
+        """
+        found: List[List[int]] = []
+        if self.consistent:
+            self._search(len(self.empty), limit, found)
+        return found
+
+    def _hidden_single(self, remaining: int) -> Optional[Tuple[int, int]]:
+        """
+        (позиция в empty, маска из одной цифры) для скрытой одиночки, (-1, 0), если её нет,
+        и None, если какой-то цифре в строке, столбце или блоке не осталось места.
+        """
+        empty, rows, cols, boxes = self.empty, self.rows, self.cols, self.boxes
+        once = [0] * 27
+        twice = [0] * 27
+        masks = []
+        for position in range(remaining):
+            index = empty[position]
+            row, col, box = ROW_OF[index], 9 + COL_OF[index], 18 + BOX_OF[index]
+            mask = ~(rows[row] | cols[col - 9] | boxes[box - 18]) & ALL_DIGITS
+            masks.append(mask)
+            twice[row] |= once[row] & mask
+            once[row] |= mask
+            twice[col] |= once[col] & mask
+            once[col] |= mask
+            twice[box] |= once[box] & mask
+            once[box] |= mask
+        used = rows + cols + boxes
+        for unit in range(27):
+            if once[unit] | used[unit] != ALL_DIGITS:
+                return None
+        for unit in range(27):
+            single = once[unit] & ~twice[unit]
+            if single:
+                bit = single & -single
+                for position in range(remaining):
+                    index = empty[position]
+                    if masks[position] & bit and unit in (ROW_OF[index], 9 + COL_OF[index], 18 + BOX_OF[index]):
+                        return position, bit
+        return -1, 0
+
+    def _search(self, remaining: int, limit: int, found: List[List[int]]) -> bool:
+        if remaining == 0:
+            found.append(list(self.values))
+            return len(found) >= limit
+        empty, rows, cols, boxes = self.empty, self.rows, self.cols, self.boxes
+        # Клетка с наименьшим числом кандидатов среди ещё не заполненных (empty[:remaining])
+        best, best_mask, best_count = 0, 0, 10
+        for position in range(remaining):
+            index = empty[position]
+            mask = ~(rows[ROW_OF[index]] | cols[COL_OF[index]] | boxes[BOX_OF[index]]) & ALL_DIGITS
+            count = POPCOUNT[mask]
+            if count < best_count:
+                best, best_mask, best_count = position, mask, count
+                if count <= 1:
+                    break
+        if best_count == 0:
+            return False
+        if best_count > 1:
+            # Ни одной клетки с единственным кандидатом: ищем «скрытую одиночку» —
+            # цифру, которой в строке, столбце или блоке осталось одно место
+            forced = self._hidden_single(remaining)
+            if forced is None:
+                return False
+            if forced[0] >= 0:
+                best, best_mask = forced
+        # Выбранная клетка переставляется в конец незаполненной части
+        last = remaining - 1
+        empty[best], empty[last] = empty[last], empty[best]
+        index = empty[last]
+        row, col, box = ROW_OF[index], COL_OF[index], BOX_OF[index]
+        for digit in DIGITS[best_mask]:
+            bit = 1 << (digit - 1)
+            self.values[index] = digit
+            rows[row] |= bit
+            cols[col] |= bit
+            boxes[box] |= bit
+            done = self._search(last, limit, found)
+            rows[row] ^= bit
+            cols[col] ^= bit
+            boxes[box] ^= bit
+            if done:
+                self.values[index] = 0
+                empty[best], empty[last] = empty[last], empty[best]
+                return True
+        self.values[index] = 0
+        empty[best], empty[last] = empty[last], empty[best]
+        return False
+
+
+def exact_cover_columns(row: int, col: int, digit: int) -> Tuple[int, int, int, int]:
+    # Ограничения: клетка занята, цифра в строке, цифра в столбце, цифра в блоке
+    box = (row // 3) * 3 + col // 3
+    return (row * 9 + col, 81 + row * 9 + digit - 1, 162 + col * 9 + digit - 1, 243 + box * 9 + digit - 1)
+
+
+# Вариант (клетка, цифра) -> покрываемые им ограничения
+CHOICES: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {
+    (index, digit): exact_cover_columns(index // 9, index % 9, digit)
+    for index in range(CELLS)
+    for digit in range(1, 10)
+}
+
+
+def build_columns() -> Dict[int, Set[Tuple[int, int]]]:
+    # Ограничение -> варианты, которые его покрывают (полная матрица до расстановки исходных цифр)
+    columns: Dict[int, Set[Tuple[int, int]]] = {column: set() for column in range(324)}
+    for choice, covered in CHOICES.items():
+        for column in covered:
+            columns[column].add(choice)
+    return columns
+
+
+COLUMNS = build_columns()
+
+
+class ExactCoverSolver:
+    """
+    Алгоритм X: на каждом шаге выбирается ограничение с наименьшим числом вариантов.
+    """
+
+    def __init__(self, board: Grid):
+        self.values = flatten(board)
+        self.columns = {column: set(choices) for column, choices in COLUMNS.items()}
+        self.consistent = True
+        for index, value in enumerate(self.values):
+            if value:
+                if any(column not in self.columns for column in CHOICES[(index, value)]):
+                    self.consistent = False
+                    break
+                self._select((index, value))
+
+    def _select(self, choice: Tuple[int, int]) -> List[Set[Tuple[int, int]]]:
+        removed = []
+        for column in CHOICES[choice]:
+            for other in self.columns[column]:
+                for other_column in CHOICES[other]:
+                    if other_column != column:
+                        self.columns[other_column].remove(other)
+            removed.append(self.columns.pop(column))
+        return removed
+
+    def _deselect(self, choice: Tuple[int, int], removed: List[Set[Tuple[int, int]]]):
+        for column in reversed(CHOICES[choice]):
+            self.columns[column] = removed.pop()
+            for other in self.columns[column]:
+                for other_column in CHOICES[other]:
+                    if other_column != column:
+                        self.columns[other_column].add(other)
+
+    def solutions(self, limit: int = 1) -> List[List[int]]:
+        found: List[List[int]] = []
+        if self.consistent:
+            self._search(limit, found)
+        return found
+
+    def _search(self, limit: int, found: List[List[int]]) -> bool:
+        if not self.columns:
+            found.append(list(self.values))
+            return len(found) >= limit
+        column = min(self.columns, key=lambda name: len(self.columns[name]))
+        for choice in list(self.columns[column]):
+            index, digit = choice
+            self.values[index] = digit
+            removed = self._select(choice)
+            done = self._search(limit, found)
+            self._deselect(choice, removed)
+            self.values[index] = 0
+            if done:
+                return True
+        return False
+
+
+ENGINES = {"bitmask": BitmaskSolver, "dlx": ExactCoverSolver}
+
+
+def solve(board: Grid, engine: str = "bitmask") -> Optional[List[int]]:
+    """
+    Решение доски (81 значение подряд) или None, если решения нет.
+    """
+    solutions = ENGINES[engine](board).solutions(limit=1)
+    return solutions[0] if solutions else None
+
+
+def count_solutions(board: Grid, limit: int = 2, engine: str = "bitmask") -> int:
+    """
+    Число решений, но не больше limit: для проверки единственности достаточно limit=2.
+    """
+    return len(ENGINES[engine](board).solutions(limit=limit))
+
+
+def solve_batch(boards: Iterable[Grid], engine: str = "bitmask") -> List[Tuple[int, Optional[List[int]]]]:
+    """
+    Для каждой доски — (число решений до 2, первое решение или None).
+    """
+    results = []
+    for board in boards:
+        solutions = ENGINES[engine](board).solutions(limit=2)
+        results.append((len(solutions), solutions[0] if solutions else None))
+    return results
+
+
+def make_unique(board: Grid) -> Tuple[List[int], List[int]]:
+    """
+    Доводит доску до единственного решения: пока решений больше одного, в первую
+    клетку, где два найденных решения расходятся, ставится цифра из первого.
+    Возвращает (доска, её решение). ValueError, если решения нет.
+    """
+    values = flatten(board)
+    while True:
+        solutions = BitmaskSolver(values).solutions(limit=2)
+        if not solutions:
+            raise ValueError("The board has no solution")
+        if len(solutions) == 1:
+            return values, solutions[0]
+        first, second = solutions
+        index = next(index for index in range(CELLS) if first[index] != second[index])
+        values[index] = first[index]
+
+
+def find_hint(values: Sequence[int], solution: Sequence[int]) -> Optional[Tuple[int, int, str]]:
+    """
+    Подсказка для текущей доски: (клетка, цифра, причина). Сначала указывается клетка,
+    заполненная неверно ("incorrect"), иначе — пустая клетка с наименьшим числом
+    кандидатов ("empty"), то есть та, которую проще всего вывести самому.
+    """
+    for index in range(CELLS):
+        if values[index] and values[index] != solution[index]:
+            return index, solution[index], "incorrect"
+    grid = BitmaskSolver(values)
+    if not grid.empty:
+        return None
+    index = min(grid.empty, key=lambda cell: POPCOUNT[grid.candidates(cell)])
+    return index, solution[index], "empty"
+
+
+def read_puzzles(path: str) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a puzzle bank: every board must have exactly one solution.")
+    parser.add_argument("file", help="one board per line: 81 characters, 0 or . for an empty cell")
+    parser.add_argument("--engine", choices=list(ENGINES), default="bitmask")
+    parser.add_argument("--workers", type=int, default=1, help="processes for solving")
+    args = parser.parse_args()
+
+    puzzles = read_puzzles(args.file)
+    start = time.perf_counter()
+    if args.workers > 1:
+        size = max(1, len(puzzles) // (args.workers * 4))
+        chunks = [puzzles[start:start + size] for start in range(0, len(puzzles), size)]
+        with ProcessPoolExecutor(args.workers) as executor:
+            results = [result for batch in executor.map(solve_batch, chunks, repeat(args.engine)) for result in batch]
+    else:
+        results = solve_batch(puzzles, args.engine)
+    elapsed = time.perf_counter() - start
+
+    invalid = [
+        {"line": number, "solutions": "none" if count == 0 else "multiple"}
+        for number, (count, _) in enumerate(results, 1)
+        if count != 1
+    ]
+    report = {
+        "puzzles": len(puzzles),
+        "unique": len(puzzles) - len(invalid),
+        "invalid": invalid,
+        "seconds": round(elapsed, 3),
+        "per_puzzle_ms": round(elapsed / len(puzzles) * 1000, 3) if puzzles else 0,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
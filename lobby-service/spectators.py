@@ -0,0 +1,293 @@
+# spectators.py
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+
+from metrics import SPECTATOR_RESYNCS
+from protocol import Codec, send_frame
+from serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT_SECONDS = 5
+STATE_TTL_SECONDS = 3600
+
+
+def channel(lobby_id: str) -> str:
+    return f"spectate:{lobby_id}"
+
+
+def state_key(lobby_id: str) -> str:
+    return f"lobby:{lobby_id}:spectate"
+
+
+class Spectator:
+    def __init__(self, websocket: WebSocket, codec: Codec, queue_size: int):
+        self.websocket = websocket
+        self.codec = codec
+        # Закодированные кадры; None — сигнал закрыть соединение
+        self.queue: "asyncio.Queue[Optional[Union[str, bytes]]]" = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
+class SpectatorHub:
+    """
+    Зрители лобби: соединения только для чтения, без ограничения в два игрока.
+
+    Рассылка зрителям отделена от рассылки игрокам: broadcast лобби лишь кладёт событие
+    в очередь publish(), а фоновая задача раскладывает его по зрителям этой реплики и
+    одним pipeline публикует в Redis (канал spectate:{lobbyId}) вместе с последним
+    состоянием лобби. Поэтому зритель может быть подключён к любой реплике, а тысячи
+    зрителей не замедляют ход игроков.
+
+    Событие кодируется один раз для каждого протокола и кладётся в ограниченную очередь
+    каждого зрителя; отправкой занимается отдельная задача зрителя. Если очередь
+    переполнена, накопленные события выбрасываются и вместо них зритель получает снимок
+    (доска, счёт, игроки). Каждый ход и так несёт всю доску, поэтому после снимка
+    зритель продолжает с актуального состояния.
+
+    Снимок в памяти хранится только для лобби, у которых есть зрители на этой реплике.
+    Состояние в Redis для остальных своих лобби берётся из state_of(lobby_id) (текущее
+    лобби в памяти реплики) в момент публикации пачки.
+    """
+
+    def __init__(self, queue_size: int = 32, publish_batch: int = 256, reconnect_delay: float = 1.0):
+        self.queue_size = max(2, queue_size)
+        self.publish_batch = publish_batch
+        self.reconnect_delay = reconnect_delay
+        # Реплика не обрабатывает собственные события, вернувшиеся через Redis
+        self.instance_id = uuid.uuid4().hex
+        self.redis = None
+        self.spectators: Dict[str, Set[Spectator]] = {}
+        # Последний снимок лобби со зрителями на этой реплике (сообщение типа snapshot)
+        self.states: Dict[str, Dict[str, Any]] = {}
+        # Снимок лобби, которое обслуживает эта реплика, или None
+        self.state_of: Callable[[str], Optional[Dict[str, Any]]] = lambda lobby_id: None
+        # Очередь создаётся в start(), внутри работающего event loop
+        self._outbox: "Optional[asyncio.Queue[Tuple[str, Dict[str, Any]]]]" = None
+        self._pubsub = None
+
+    def start(
+        self, redis_client, state_of: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+    ) -> List[asyncio.Task]:
+        """
+        Запускает публикацию событий и подписку на события других реплик (вызывается в lifespan).
+        """
+        self.redis = redis_client
+        if state_of is not None:
+            self.state_of = state_of
+        self._outbox = asyncio.Queue()
+        return [asyncio.create_task(self._publish_loop()), asyncio.create_task(self._listen())]
+
+    def publish(self, lobby_id: str, message: Dict[str, Any]):
+        """
+        Передаёт событие лобби зрителям. Не ждёт ни Redis, ни отправки.
+        """
+        if self._outbox is None:
+            return
+        message = dict(message)
+        if "scores" in message:
+            # Счёт в сообщениях — живой словарь лобби; к моменту отправки он изменится
+            message["scores"] = dict(message["scores"])
+        self._outbox.put_nowait((lobby_id, message))
+
+    def close(self, lobby_id: str):
+        """
+        Лобби удалено: зрители получают lobby_closed и отключаются на всех репликах.
+        """
+        self.publish(lobby_id, {"type": "lobby_closed", "lobbyId": lobby_id})
+
+    def forget(self, lobby_id: str):
+        """
+        Лобби ушло из памяти реплики: локальный снимок больше не поддерживается. Ключ в Redis
+        остаётся — по нему load_state отдаст снимок, пока лобби не вернётся.
+        """
+        self.states.pop(lobby_id, None)
+
+    def redirect(self, message: Callable[[str], Dict[str, Any]]):
+        """
+        Реплика останавливается: каждый зритель получает message(lobby_id) — куда и когда
+        переподключиться — и отключается. Сообщение строится для каждого зрителя отдельно,
+        чтобы переподключения были разнесены по времени.
+        """
+        for lobby_id, watchers in self.spectators.items():
+            for spectator in watchers:
+                # Неотправленные события не нужны: после переподключения зритель получит снимок
+                while spectator.queue.qsize() > self.queue_size - 2:
+                    spectator.queue.get_nowait()
+                spectator.queue.put_nowait(spectator.codec.encode(message(lobby_id)))
+                spectator.queue.put_nowait(None)
+
+    async def load_state(self, lobby_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Снимок лобби, которое обслуживает другая реплика.
+        """
+        state = self.states.get(lobby_id)
+        if state is None:
+            raw = await self.redis.get(state_key(lobby_id))
+            if raw is not None:
+                state = loads(raw)
+        return state
+
+    async def attach(self, lobby_id: str, websocket: WebSocket, codec: Codec, state: Dict[str, Any]) -> Spectator:
+        spectator = Spectator(websocket, codec, self.queue_size)
+        spectator.queue.put_nowait(codec.encode(state))
+        spectator.task = asyncio.create_task(self._send_loop(lobby_id, spectator))
+        watchers = self.spectators.setdefault(lobby_id, set())
+        watchers.add(spectator)
+        if lobby_id not in self.states:
+            self.states[lobby_id] = dict(state, scores=dict(state.get("scores") or {}))
+        if len(watchers) == 1 and self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(channel(lobby_id))
+            except Exception as e:
+                # Подписка восстановится вместе с соединением в _listen
+                logger.warning("Не удалось подписаться на события лобби %s: %s", lobby_id, e)
+        return spectator
+
+    async def detach(self, lobby_id: str, spectator: Spectator):
+        if spectator.task is not None:
+            spectator.task.cancel()
+        watchers = self.spectators.get(lobby_id)
+        if watchers is None or spectator not in watchers:
+            return
+        watchers.discard(spectator)
+        if not watchers:
+            del self.spectators[lobby_id]
+            self.states.pop(lobby_id, None)
+            if self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(channel(lobby_id))
+                except Exception as e:
+                    logger.warning("Не удалось отписаться от событий лобби %s: %s", lobby_id, e)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {lobby_id: len(watchers) for lobby_id, watchers in self.spectators.items()}
+
+    def _update_state(self, lobby_id: str, message: Dict[str, Any]):
+        kind = message.get("type")
+        if kind != "lobby_closed" and lobby_id not in self.spectators:
+            # Без зрителей на этой реплике снимок не нужен
+            return
+        if kind == "snapshot":
+            self.states[lobby_id] = message
+        elif kind == "lobby_closed":
+            self.states.pop(lobby_id, None)
+        elif "board" in message and lobby_id in self.states:
+            state = dict(self.states[lobby_id], board=message["board"], scores=message["scores"])
+            if kind == "game_over":
+                state["finished"] = True
+            self.states[lobby_id] = state
+
+    def _deliver(self, lobby_id: str, message: Dict[str, Any]):
+        self._update_state(lobby_id, message)
+        watchers = self.spectators.get(lobby_id)
+        if not watchers:
+            return
+        closing = message.get("type") == "lobby_closed"
+        # Сообщение и, при необходимости, снимок кодируются один раз для каждого протокола
+        frames: Dict[Codec, Union[str, bytes]] = {}
+        resync_frames: Dict[Codec, Union[str, bytes]] = {}
+        for spectator in list(watchers):
+            codec = spectator.codec
+            frame = frames.get(codec)
+            if frame is None:
+                frame = frames[codec] = codec.encode(message)
+            if closing:
+                # Последнее сообщение и сигнал закрытия должны поместиться в очередь
+                while spectator.queue.qsize() > self.queue_size - 2:
+                    spectator.queue.get_nowait()
+                spectator.queue.put_nowait(frame)
+                spectator.queue.put_nowait(None)
+                continue
+            try:
+                spectator.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Зритель не успевает: вместо пропущенных событий — текущее состояние
+                while not spectator.queue.empty():
+                    spectator.queue.get_nowait()
+                state = self.states.get(lobby_id)
+                if state is None:
+                    spectator.queue.put_nowait(frame)
+                else:
+                    resync = resync_frames.get(codec)
+                    if resync is None:
+                        resync = resync_frames[codec] = codec.encode(state)
+                    spectator.queue.put_nowait(resync)
+                SPECTATOR_RESYNCS.inc()
+
+    async def _send_loop(self, lobby_id: str, spectator: Spectator):
+        try:
+            while True:
+                frame = await spectator.queue.get()
+                if frame is None:
+                    await spectator.websocket.close()
+                    break
+                await asyncio.wait_for(send_frame(spectator.websocket, spectator.codec, frame), timeout=SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("Зритель лобби %s отключён: %s", lobby_id, e)
+            try:
+                await spectator.websocket.close()
+            except Exception:
+                pass
+
+    async def _publish_loop(self):
+        while True:
+            batch = [await self._outbox.get()]
+            while len(batch) < self.publish_batch and not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            try:
+                for lobby_id, message in batch:
+                    self._deliver(lobby_id, message)
+                await self._relay(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка рассылки зрителям: %s", e)
+
+    async def _relay(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        # Для каждого лобби в Redis сохраняется только итоговое состояние пачки
+        changed: Dict[str, bool] = {}  # lobby_id -> лобби закрыто
+        pipe = self.redis.pipeline(transaction=False)
+        for lobby_id, message in batch:
+            pipe.publish(channel(lobby_id), dumps_str({"origin": self.instance_id, "lobbyId": lobby_id, "event": message}))
+            kind = message.get("type")
+            if kind == "lobby_closed" or "board" in message or kind == "snapshot":
+                changed[lobby_id] = kind == "lobby_closed"
+        for lobby_id, closed in changed.items():
+            if closed:
+                pipe.delete(state_key(lobby_id))
+                continue
+            state = self.states.get(lobby_id) or self.state_of(lobby_id)
+            if state is not None:
+                # Лобби, уже ушедшие из памяти реплики, сохраняют последнее записанное состояние
+                pipe.set(state_key(lobby_id), dumps_str(state), ex=STATE_TTL_SECONDS)
+        await pipe.execute()
+
+    async def _listen(self):
+        """
+        События лобби, которые обслуживают другие реплики, для зрителей этой реплики.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Канал реплики держит соединение подписки открытым, даже когда зрителей нет
+                await pubsub.subscribe(channel(self.instance_id), *(channel(lobby_id) for lobby_id in self.spectators))
+                self._pubsub = pubsub
+                async for message in pubsub.listen():
+                    envelope = loads(message["data"])
+                    if envelope.get("origin") != self.instance_id:
+                        self._deliver(envelope["lobbyId"], envelope["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Подписка на события зрителей прервана: %s", e)
+            finally:
+                self._pubsub = None
+                await pubsub.aclose()
+            await asyncio.sleep(self.reconnect_delay)
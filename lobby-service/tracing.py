@@ -0,0 +1,261 @@
+# tracing.py
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Контекст трассировки передаётся между сервисами в заголовке W3C traceparent:
+#   00-<trace-id, 32 hex>-<span-id, 16 hex>-<флаги, 01 = sampled>
+TRACEPARENT_HEADER = "traceparent"
+
+# Доля корневых трасс, которые записываются. Для продолжения чужой трассы
+# решение берётся из флага sampled родителя (parent-based sampling)
+TRACE_SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", 0.01))
+# Файл JSONL для экспорта спанов; если не задан, спаны не записываются
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "start_ns", "attributes", "status")
+
+    def __init__(self, trace_id: str, span_id: str, parent_id: Optional[str], name: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """
+    Разбирает заголовок traceparent. Возвращает (trace_id, parent_span_id, sampled) или None.
+    """
+    parts = value.strip().lower().split("-")
+    if len(parts) != 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, span_id, flags = parts
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id, span_id, sampled
+
+
+class JsonlExporter:
+    """
+    Пишет завершённые спаны в файл JSONL из отдельного потока, чтобы запись на диск
+    не блокировала event loop. Если очередь переполнена, спаны отбрасываются.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, record: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def shutdown(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch: List[Optional[Dict[str, Any]]] = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            if records:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(record, default=str) + "\n" for record in records)
+                except OSError as e:
+                    logger.warning("Не удалось записать спаны в %s: %s", self.path, e)
+            if len(records) != len(batch):
+                return
+
+
+class Tracer:
+    def __init__(self, service: str, sample_ratio: float = TRACE_SAMPLE_RATIO, exporter: Optional[JsonlExporter] = None):
+        self.service = service
+        self.sample_ratio = sample_ratio
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, remote: Optional[Tuple[str, str, bool]] = None) -> Span:
+        """
+        Создаёт спан — дочерний к текущему, к удалённому родителю remote
+        (из traceparent) или корневой. Спан не становится текущим.
+        """
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        else:
+            parent = _current_span.get()
+            if parent is not None:
+                trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+            else:
+                trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+                sampled = self.exporter is not None and random.random() < self.sample_ratio
+        return Span(trace_id, f"{random.getrandbits(64):016x}", parent_id, name, sampled)
+
+    def end_span(self, span: Span):
+        if not span.sampled or self.exporter is None:
+            return
+        end_ns = time.time_ns()
+        self.exporter.export({
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id,
+            "name": span.name,
+            "service": self.service,
+            "startTimeUnixNano": span.start_ns,
+            "endTimeUnixNano": end_ns,
+            "durationMs": round((end_ns - span.start_ns) / 1e6, 3),
+            "attributes": span.attributes,
+            "status": span.status,
+        })
+
+    @contextmanager
+    def span(self, name: str, remote: Optional[Tuple[str, str, bool]] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Спан, который на время блока становится текущим. Работает и в корутинах:
+        текущий спан хранится в contextvar и не смешивается между задачами.
+        """
+        span = self.start_span(name, remote)
+        if span.sampled:
+            span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def inject(self, headers: Dict[str, str]) -> Dict[str, str]:
+        """
+        Добавляет traceparent текущего спана в заголовки исходящего запроса.
+        """
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent()
+        return headers
+
+    def instrument_engine(self, engine: AsyncEngine):
+        """
+        Создаёт спан на каждый SQL-запрос через события SQLAlchemy.
+        """
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            span = self.start_span("db.query")
+            span.set_attribute("db.statement", statement[:200])
+            conn.info.setdefault("trace_spans", []).append(span)
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            spans = conn.info.get("trace_spans")
+            if spans:
+                self.end_span(spans.pop())
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(exception_context):
+            spans = exception_context.connection.info.get("trace_spans") if exception_context.connection else None
+            if spans:
+                span = spans.pop()
+                span.status = "error"
+                span.set_attribute("error", repr(exception_context.original_exception))
+                self.end_span(span)
+
+
+class TracingMiddleware:
+    """
+    ASGI-middleware: продолжает трассу из входящего traceparent (или начинает новую)
+    и создаёт серверный спан на каждый HTTP-запрос.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        remote = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                remote = parse_traceparent(value.decode("latin-1"))
+                break
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with self.tracer.span(f"HTTP {scope['method']}", remote, **{"http.path": scope["path"]}) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"HTTP {scope['method']} {route.path}"
+
+
+tracer = Tracer(
+    "lobby-service",
+    exporter=JsonlExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None,
+)
@@ -0,0 +1,130 @@
+"""
+Lobby-service tables exported to the warehouse and the watermark each one is read by.
+
+A stream is read in (time column, key columns) order with keyset pagination, so a run
+only touches rows after the last exported watermark and never rescans old ones:
+
+- users: new accounts by (created_at, id);
+- games: finished games by (end_time, id); a game is exported once, with its result;
+- game_players: players of finished games by (games.end_time, game_id, player_id);
+- chat_messages: messages by (timestamp, id).
+
+Rows newer than the settle interval are left for the next run, so a transaction that
+committed late with an older timestamp is not skipped.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+from sqlalchemy import DateTime, Integer, String, column, select, table, tuple_
+from sqlalchemy.sql import ColumnElement, Select
+
+users = table(
+    "users",
+    column("id", Integer),
+    column("username", String),
+    column("created_at", DateTime),
+)
+games = table(
+    "games",
+    column("id", Integer),
+    column("lobby_id", String),
+    column("game_id", String),
+    column("start_time", DateTime),
+    column("end_time", DateTime),
+    column("winner", String),
+)
+game_players = table(
+    "game_players",
+    column("game_id", Integer),
+    column("player_id", Integer),
+)
+chat_messages = table(
+    "chat_messages",
+    column("id", Integer),
+    column("game_id", Integer),
+    column("lobby_id", String),
+    column("sender", String),
+    column("message", String),
+    column("timestamp", DateTime),
+)
+
+TIMESTAMP = pa.timestamp("us")
+
+
+class Stream:
+    def __init__(
+        self,
+        name: str,
+        query: Select,
+        time_column: ColumnElement,
+        key_columns: Sequence[ColumnElement],
+        schema: pa.Schema,
+    ):
+        self.name = name
+        self.query = query
+        self.time_column = time_column
+        self.key_columns = list(key_columns)
+        self.schema = schema
+
+    def batch_query(self, watermark: Optional[Tuple[Any, ...]], cutoff: datetime) -> Select:
+        """
+        Rows after the watermark that are older than cutoff, in watermark order.
+        """
+        query = self.query.where(self.time_column.is_not(None), self.time_column <= cutoff)
+        if watermark is not None:
+            query = query.where(tuple_(self.time_column, *self.key_columns) > tuple_(*watermark))
+        return query.order_by(self.time_column, *self.key_columns)
+
+    def watermark(self, row: Sequence[Any]) -> Tuple[Any, ...]:
+        # The query selects the watermark columns first
+        return tuple(row[:1 + len(self.key_columns)])
+
+    def to_columns(self, rows: List[Sequence[Any]]) -> Dict[str, List[Any]]:
+        return {field.name: [row[i] for row in rows] for i, field in enumerate(self.schema)}
+
+
+STREAMS = {
+    stream.name: stream
+    for stream in (
+        Stream(
+            "users",
+            select(users.c.created_at, users.c.id, users.c.username),
+            users.c.created_at,
+            [users.c.id],
+            pa.schema([("created_at", TIMESTAMP), ("id", pa.int64()), ("username", pa.string())]),
+        ),
+        Stream(
+            "games",
+            select(games.c.end_time, games.c.id, games.c.lobby_id, games.c.game_id, games.c.start_time, games.c.winner),
+            games.c.end_time,
+            [games.c.id],
+            pa.schema([
+                ("end_time", TIMESTAMP), ("id", pa.int64()), ("lobby_id", pa.string()),
+                ("game_id", pa.string()), ("start_time", TIMESTAMP), ("winner", pa.string()),
+            ]),
+        ),
+        Stream(
+            "game_players",
+            select(games.c.end_time, game_players.c.game_id, game_players.c.player_id).select_from(
+                game_players.join(games, games.c.id == game_players.c.game_id)
+            ),
+            games.c.end_time,
+            [game_players.c.game_id, game_players.c.player_id],
+            pa.schema([("game_end_time", TIMESTAMP), ("game_id", pa.int64()), ("player_id", pa.int64())]),
+        ),
+        Stream(
+            "chat_messages",
+            select(
+                chat_messages.c.timestamp, chat_messages.c.id, chat_messages.c.game_id,
+                chat_messages.c.lobby_id, chat_messages.c.sender, chat_messages.c.message,
+            ),
+            chat_messages.c.timestamp,
+            [chat_messages.c.id],
+            pa.schema([
+                ("timestamp", TIMESTAMP), ("id", pa.int64()), ("game_id", pa.int64()),
+                ("lobby_id", pa.string()), ("sender", pa.string()), ("message", pa.string()),
+            ]),
+        ),
+    )
+}